@@ -0,0 +1,34 @@
+########################################################################################################################
+#   Inter-rater reliability of JSON files exported from EPPI reviewer. The functions below are imported from their
+#   modules the first time they are used, so importing the package itself is cheap
+########################################################################################################################
+
+
+lazyNames = {
+    'loadExport': 'api',
+    'compareCodesets': 'api',
+    'mergeAnnotations': 'api',
+    'computeAlpha': 'api',
+    'runJob': 'api',
+    'MergedAnnotations': 'api',
+    'JobResult': 'api',
+    'ExportCache': 'exports',
+    'ReviewExport': 'exports',
+    'TextAgreement': 'textagreement',
+    'IrrService': 'service',
+    'main': 'cli',
+}
+
+__all__ = list(lazyNames)
+
+def __getattr__(name):
+
+    if name not in lazyNames:
+        raise AttributeError('module ' + repr(__name__) + ' has no attribute ' + repr(name))
+
+    from importlib import import_module
+
+    value = getattr(import_module('.' + lazyNames[name], __name__), name)
+    globals()[name] = value
+
+    return value
@@ -0,0 +1,309 @@
+########################################################################################################################
+#   The functions a pipeline calls to run inter-rater reliability jobs in a long-lived process: loading one export,
+#   comparing the codesets of a group of exports, merging the annotations of the groups, computing alpha, and runJob,
+#   which does all of that for one job and writes the same output files as the command line
+########################################################################################################################
+
+
+import csv
+import os
+import warnings
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+
+from .codesets import CodesetTree, checkCodesetGroup, checkCodesets
+from .columnar import columnarSpreadsheetWriter
+from .exports import ReviewExport, loadReviewExports
+from .incremental import IncrementalState
+from .instrumentation import noStageRecorder
+from .levels import TypedValues
+from .merge import mergeCoderRows, processCoderGroup, produceCsv, spreadsheetWriters
+from .reliability import (attributeAlphaValues, bootstrapIntervals, hierarchyAlphaValues, pairwiseAlphaValues, pairwiseTable,
+                          valueCountPatterns)
+from .textagreement import TextAgreement
+
+resultsFileName = 'IRR_PythonScript_Results.csv'
+hierarchyResultsFileName = 'IRR_PythonScript_Hierarchy_Results.csv'
+comparisonFileName = 'fileComparison.txt'
+reportFileName = 'IRR_PythonScript_Report.jsonl'
+
+#   the loadExport function parses one JSON file exported from EPPI reviewer, or reads it from an ExportCache when one is given
+
+def loadExport(jsonFileName, cache=None):
+
+    if cache is None:
+        return ReviewExport(jsonFileName)
+
+    return loadReviewExports([jsonFileName], cache)[jsonFileName]
+
+#   the compareCodesets function compares the codesets of every pair of a group of exports. It returns a list of CodesetComparisons and
+#   the text written to fileComparison.txt
+
+def compareCodesets(coderExports):
+
+    return checkCodesetGroup(coderExports)
+
+#   the mergeAnnotations function merges the annotations of each group of exports, one export per coder in every group, into a
+#   MergedAnnotations. The binary and text rows are given to the optional csv writers and TextAgreement as they are produced
+
+MergedAnnotations = namedtuple('MergedAnnotations', ['listOfAttributes', 'attributeIndex', 'reliabilityData', 'rowKeys'])
+
+def mergeAnnotations(exportGroups, binaryWriter=None, textWriter=None, textAgreement=None):
+
+    return MergedAnnotations(*mergeCoderRows((produceCsv(coderExports) for coderExports in exportGroups), len(exportGroups[0]),
+                                             binaryWriter, textWriter, textAgreement))
+
+#   the computeAlpha function gives the alpha value of every attribute with data of a MergedAnnotations and the two overall values. With
+#   coderSubset, a list of coder numbers, only those coders' values are used
+
+def computeAlpha(mergedAnnotations, coderSubset=None):
+
+    reliabilityData = mergedAnnotations.reliabilityData
+
+    if coderSubset is not None:
+        reliabilityData = reliabilityData[list(coderSubset)]
+
+    return attributeAlphaValues(mergedAnnotations.listOfAttributes, mergedAnnotations.attributeIndex, reliabilityData)
+
+# the runJob function runs the whole calculation for the groups of JSON files in coderGroups, one file per coder in each group and at least
+# two coders, and writes the output files to outputDirectory. With workers 1 and no cache the JSON files are parsed once up front and the
+# rows of each group are streamed straight to the spreadsheets. Otherwise each group of JSON files is handled by processCoderGroup, in a process pool when there
+# is more than one worker, and the results are collected in group order so the output files are identical to a serial run. Each stage is
+# measured by recorder, a StageRecorder, when one is given. With columnarFormat, 'parquet' or 'arrow', the spreadsheets are also written
+# as one columnar table. With attributeLevels, from readAttributeLevels, the attributes given an ordinal, interval or ratio level have
+# their alpha values computed at that level from the first number in each coder's text. reviewExports, a dictionary of ReviewExports by
+# file name, gives exports that are already loaded, such as those a long-running service keeps, and the job then runs serially on
+# them without parsing. It returns a JobResult holding the CodesetComparisons and the values written to the results csv file
+
+JobResult = namedtuple('JobResult', ['comparisons', 'alphaValues', 'coderPairs', 'pairwiseValues', 'intervals', 'textValues'])
+
+def runJob(coderGroups, outputDirectory='.', resultsFileName=resultsFileName, writeSpreadsheets=True, computePairwiseAlpha=False, workers=1,
+           cache=None, incremental=None, bootstrap=0, confidence=0.95, seed=None, computeTextAgreement=False, computeHierarchy=False,
+           recorder=noStageRecorder, columnarFormat=None, attributeLevels=None, reviewExports=None):
+
+    for coderFiles in coderGroups:
+
+        if len(coderFiles) < 2:
+            raise ValueError('Every group must list at least two JSON files, one per coder')
+
+        if len(coderFiles) != len(coderGroups[0]):
+            raise ValueError('Every group must list one JSON file per coder: ' + ', '.join(coderFiles))
+
+    if incremental is not None:
+
+        with recorder.stage('loadExports') as span:
+            if reviewExports is None:
+                reviewExports = loadReviewExports([coderFile for coderFiles in coderGroups for coderFile in coderFiles], cache)
+            span.count(files=len(reviewExports), papers=sum(len(reviewExport.papers) for reviewExport in reviewExports.values()))
+
+        with recorder.stage('checkCodesets', groups=len(coderGroups)):
+            comparisons, comparisonReport = checkCodesets(reviewExports, coderGroups)
+
+        with recorder.stage('incrementalUpdate', groups=len(coderGroups)):
+            state = IncrementalState.load(incremental, len(coderGroups[0]))
+            state.update(reviewExports, coderGroups)
+
+        groupRows = state.groupRows()
+        groupCodeSets = [reviewExports[coderFiles[0]].codeSets for coderFiles in coderGroups]
+
+    elif reviewExports is None and (workers > 1 or cache is not None):
+
+        with recorder.stage('processCoderGroups', groups=len(coderGroups), workers=workers):
+            if workers > 1:
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    groupResults = list(executor.map(processCoderGroup, coderGroups, [cache] * len(coderGroups)))
+            else:
+                groupResults = [processCoderGroup(coderFiles, cache) for coderFiles in coderGroups]
+
+        comparisons = [comparison for groupResult in groupResults for comparison in groupResult[0]]
+        comparisonReport = ''.join(groupResult[1] for groupResult in groupResults)
+        groupRows = [groupResult[2] for groupResult in groupResults]
+        groupCodeSets = [groupResult[3] for groupResult in groupResults]
+
+    else:
+
+        #   the JSON files are parsed once, so that every later stage shares the same in-memory export
+
+        with recorder.stage('loadExports') as span:
+            if reviewExports is None:
+                reviewExports = loadReviewExports([coderFile for coderFiles in coderGroups for coderFile in coderFiles])
+            span.count(files=len(reviewExports), papers=sum(len(reviewExport.papers) for reviewExport in reviewExports.values()))
+
+        with recorder.stage('checkCodesets', groups=len(coderGroups)):
+            comparisons, comparisonReport = checkCodesets(reviewExports, coderGroups)
+
+        #   the rows are produced as mergeCoderRows reads them, so the merge stage below includes produceCsv
+
+        groupRows = (produceCsv([reviewExports[coderFile] for coderFile in coderFiles]) for coderFiles in coderGroups)
+        groupCodeSets = [reviewExports[coderFiles[0]].codeSets for coderFiles in coderGroups]
+
+    # The code below writes the results of the codeset check, comparing the JSON files of every pair of coders in every group
+
+    with recorder.stage('writeComparison'), open(os.path.join(outputDirectory, comparisonFileName), 'w') as file:
+        file.write(comparisonReport)
+
+    # The below code passes the binary and text rows of each group of JSON files to the mergeCoderRows function. The binary columns are
+    # kept in memory for the reliability stage, and when writeSpreadsheets is set the rows are also written straight to the two csv files.
+    # With --text-agreement the text rows are also given to a TextAgreement, and with --columnar both are written to a ColumnarWriter. In an
+    # incremental run the rows are only written and given to the TextAgreement and TypedValues, as the coincidence totals are already up
+    # to date
+
+    if computeTextAgreement:
+        textAgreement = TextAgreement(len(coderGroups[0]))
+    else:
+        textAgreement = None
+
+    if attributeLevels:
+        typedValues = TypedValues(attributeLevels, len(coderGroups[0]))
+    else:
+        typedValues = None
+
+    with recorder.stage('merge', spreadsheets=writeSpreadsheets, columnarFormat=columnarFormat) as span, \
+            spreadsheetWriters(len(coderGroups[0]), outputDirectory if writeSpreadsheets else None) as (binaryWriter, textWriter), \
+            columnarSpreadsheetWriter(len(coderGroups[0]), outputDirectory, columnarFormat) as columnarWriter:
+
+        if incremental is None:
+
+            listOfAttributes, attributeIndex, reliabilityData, rowKeys = mergeCoderRows(groupRows, len(coderGroups[0]), binaryWriter, textWriter,
+                                                                                        textAgreement, columnarWriter, typedValues)
+            span.count(rows=reliabilityData.shape[1], attributes=len(listOfAttributes))
+
+        elif binaryWriter is not None or textAgreement is not None or columnarWriter is not None or typedValues is not None:
+
+            for rows in groupRows:
+                for binaryRow, textRow in rows:
+                    if binaryWriter is not None:
+                        binaryWriter.writerow(binaryRow)
+                        textWriter.writerow(textRow)
+                    if textAgreement is not None:
+                        textAgreement.addRow(textRow)
+                    if columnarWriter is not None:
+                        columnarWriter.writerow(binaryRow, textRow)
+                    if typedValues is not None:
+                        typedValues.addRow(binaryRow, textRow)
+
+    # an entry of attributeLevels that matched no AttributeId or title would otherwise leave its attribute nominal without a word
+
+    if typedValues is not None and typedValues.unusedLevels():
+        warnings.warn('no attribute has the AttributeId or title of these --levels entries, which were left unused: '
+                      + ', '.join(repr(levelKey) for levelKey in typedValues.unusedLevels()), stacklevel=2)
+
+    # the below creates a dictionary which gives the associated alpha value over all coders for each attribute with data and the two overall
+    # values, and when computePairwiseAlpha is set the alpha values of every pair of coders as well
+
+    with recorder.stage('alpha', pairwise=computePairwiseAlpha) as span:
+
+        if incremental is None:
+
+            alphaValues = attributeAlphaValues(listOfAttributes, attributeIndex, reliabilityData)
+
+            if computePairwiseAlpha:
+                coderPairs, pairwiseValues = pairwiseAlphaValues(listOfAttributes, attributeIndex, reliabilityData, alphaValues)
+            else:
+                coderPairs, pairwiseValues = [], {key: [] for key in alphaValues}
+
+            if bootstrap > 0:
+                patterns, patternCounts = valueCountPatterns(reliabilityData, attributeIndex, len(listOfAttributes))
+
+        else:
+
+            alphaValues = state.alphaValues(tuple(range(len(coderGroups[0]))))
+
+            if computePairwiseAlpha:
+                coderPairs = list(combinations(range(len(coderGroups[0])), 2))
+                pairwiseValues = pairwiseTable(alphaValues, [state.alphaValues(coderPair) for coderPair in coderPairs])
+            else:
+                coderPairs, pairwiseValues = [], {key: [] for key in alphaValues}
+
+            if bootstrap > 0:
+                listOfAttributes, patterns, patternCounts = state.bootstrapPatterns()
+
+            state.save(incremental)
+
+        span.count(attributesWithData=len(alphaValues) - 2)
+
+    # the below replaces the binary alpha values of the attributes with a level other than nominal by their alpha at that level. The two
+    # overall values stay binary, and so do the bootstrap intervals, which are left empty for those attributes. When no attribute was given
+    # a level other than nominal every alpha value stays as it is
+
+    if typedValues is not None:
+
+        if typedValues.attributeIndexByTitle:
+
+            with recorder.stage('typedAlpha', attributes=len(typedValues.attributeIndexByTitle), rows=len(typedValues.attributeColumn)):
+
+                typedAlphas = typedValues.alphaValues()
+                typedPairwise = [typedValues.alphaValues(coderPair) for coderPair in coderPairs]
+
+                for title, alpha in typedAlphas.items():
+                    if title in alphaValues:
+                        alphaValues[title] = alpha
+                        pairwiseValues[title] = [pairAlphas[title] for pairAlphas in typedPairwise]
+
+        levelValues = {key: [typedValues.levelByTitle.get(key, 'nominal')] for key in alphaValues}
+        levelHeader = ['level of measurement']
+
+    else:
+        levelValues = {key: [] for key in alphaValues}
+        levelHeader = []
+
+    # the below adds bootstrap confidence intervals of the alpha values over all coders when --bootstrap is given
+
+    if bootstrap > 0:
+        with recorder.stage('bootstrap', replicates=bootstrap, patterns=len(patterns), workers=workers):
+            intervals = bootstrapIntervals(listOfAttributes, patterns, patternCounts, alphaValues, bootstrap, confidence, seed, workers)
+        if typedValues is not None:
+            intervals.update({title: ['', ''] for title in typedValues.levelByTitle if title in intervals})
+        intervalHeader = ['lower ' + format(100 * confidence, 'g') + '% CI', 'upper ' + format(100 * confidence, 'g') + '% CI']
+    else:
+        intervals = {key: [] for key in alphaValues}
+        intervalHeader = []
+
+    # the below adds the text agreement of each attribute when --text-agreement is given, left empty for an attribute where no two coders
+    # both annotated text
+
+    if textAgreement is not None:
+        with recorder.stage('textAgreement', cells=len(textAgreement.cellLengths), pairs=len(textAgreement.pairAttribute)):
+            textValues = textAgreement.values()
+        textValues = {key: textValues.get(key, [0, '', '', '']) for key in alphaValues}
+        textHeader = ['text pairs', 'exact text match', 'token Jaccard index', 'character overlap']
+    else:
+        textValues = {key: [] for key in alphaValues}
+        textHeader = []
+
+    # the below writes the alpha value of every node of the codeset trees when --hierarchy is given. An incremental run only keeps the
+    # coincidence totals of single attributes, so its rows are merged again here
+
+    if computeHierarchy:
+
+        with recorder.stage('hierarchy') as span:
+
+            if incremental is not None:
+                listOfAttributes, attributeIndex, reliabilityData, rowKeys = mergeCoderRows(state.groupRows(), len(coderGroups[0]))
+
+            tree = CodesetTree()
+
+            for codeSets in groupCodeSets:
+                tree.addCodeSet(codeSets[0])
+
+            hierarchyValues = hierarchyAlphaValues(tree, [codeSets[0]['SetId'] for codeSets in groupCodeSets], rowKeys, reliabilityData)
+            span.count(nodes=len(tree.attributeIds), rows=reliabilityData.shape[1])
+
+            with open(os.path.join(outputDirectory, hierarchyResultsFileName), 'w', newline='') as csv_file:
+                writer = csv.writer(csv_file, quoting=csv.QUOTE_ALL)
+                writer.writerow(['codeset', 'AttributeId', 'attributes', 'level', 'descendants', 'alpha values'])
+                for node in range(len(tree.attributeIds)):
+                    writer.writerow([tree.setNames[node], tree.attributeIds[node], tree.attributeNames[node], tree.depths[node],
+                                     tree.subtreeEnds[node] - node - 1, hierarchyValues[node]])
+
+    #   the below prints the results to a csv file
+
+    with recorder.stage('writeResults', rows=len(alphaValues)), open(os.path.join(outputDirectory, resultsFileName), 'w', newline='') as csv_file:
+        writer = csv.writer(csv_file, quoting=csv.QUOTE_ALL)
+        writer.writerow(['attributes', 'alpha values'] + levelHeader + intervalHeader + textHeader + ['alpha values Coder' + str(coder1 + 1) + '-Coder' + str(coder2 + 1) for coder1, coder2 in coderPairs])
+        for key, value in alphaValues.items():
+            #print(key)
+            writer.writerow([key, value] + levelValues[key] + intervals[key] + textValues[key] + pairwiseValues[key])
+
+    return JobResult(comparisons, alphaValues, coderPairs, pairwiseValues, intervals, textValues)
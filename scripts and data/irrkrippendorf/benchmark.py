@@ -0,0 +1,172 @@
+########################################################################################################################
+#   Benchmarks of each stage of the calculation on synthetic exports from irrkrippendorf.synthetic, saved as JSON so
+#   that runs on different versions of the code can be compared. Run it with python -m irrkrippendorf.benchmark
+########################################################################################################################
+
+
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+
+from .api import MergedAnnotations, compareCodesets, computeAlpha, loadExport
+from .codesets import getCodeSet
+from .merge import mergeCoderRows, produceCsv, spreadsheetWriters
+from .synthetic import writeSyntheticExports
+from .textagreement import TextAgreement
+
+#   the measureStage function runs stageFunction repeats times and gives its last result with the fastest and mean wall time, then runs
+#   it once more under tracemalloc for the peak memory it allocates. The timed runs are not traced, as tracing slows them down
+
+def measureStage(stageFunction, repeats):
+
+    seconds = []
+
+    for repeat in range(repeats):
+        start = time.perf_counter()
+        result = stageFunction()
+        seconds.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+
+    try:
+        stageFunction()
+        peakBytes = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return result, {'seconds': min(seconds), 'meanSeconds': sum(seconds) / len(seconds), 'peakTracedBytes': peakBytes}
+
+#   the benchmarkExports function measures every stage on one group of exports, one per coder, and gives a dictionary of the stage
+#   measurements along with the sizes of the data each stage handled
+
+def benchmarkExports(jsonFileNames, repeats, outputDirectory):
+
+    stages = {}
+
+    coderExports, stages['parse'] = measureStage(lambda: [loadExport(jsonFileName) for jsonFileName in jsonFileNames], repeats)
+    codeSets, stages['getCodeSet'] = measureStage(lambda: [getCodeSet(coderExport) for coderExport in coderExports], repeats)
+    comparisons, stages['compareCodesets'] = measureStage(lambda: compareCodesets(coderExports), repeats)
+    rows, stages['produceCsv'] = measureStage(lambda: list(produceCsv(coderExports)), repeats)
+    merged, stages['mergeCoderRows'] = measureStage(lambda: MergedAnnotations(*mergeCoderRows([rows], len(coderExports))), repeats)
+    alphaValues, stages['alpha'] = measureStage(lambda: computeAlpha(merged), repeats)
+
+    def textAgreementStage():
+
+        textAgreement = TextAgreement(len(coderExports))
+
+        for binaryRow, textRow in rows:
+            textAgreement.addRow(textRow)
+
+        return textAgreement.values()
+
+    textValues, stages['textAgreement'] = measureStage(textAgreementStage, repeats)
+
+    def writeSpreadsheetsStage():
+
+        with spreadsheetWriters(len(coderExports), outputDirectory) as (binaryWriter, textWriter):
+            for binaryRow, textRow in rows:
+                binaryWriter.writerow(binaryRow)
+                textWriter.writerow(textRow)
+
+    unused, stages['writeSpreadsheets'] = measureStage(writeSpreadsheetsStage, repeats)
+
+    sizes = {'exportBytes': sum(os.path.getsize(jsonFileName) for jsonFileName in jsonFileNames),
+             'papers': len(coderExports[0].papers),
+             'attributes': len(codeSets[0][0]),
+             'codedCells': sum(len(coderExport.annotations.cellAttribute) for coderExport in coderExports),
+             'rows': len(rows),
+             'textPairs': textValues['All Entities'][0]}
+
+    return {'sizes': sizes, 'stages': stages}
+
+#   the compareResults function prints, for every run with the same number of papers in both results, how many times slower each stage
+#   is than in the previous results, marking the stages that are more than tolerance times slower. Runs with the same number of papers
+#   are only comparable when the exports were made with the same parameters, so when any parameter differs it prints the ones that
+#   differ instead
+
+def compareResults(results, previousResults, tolerance=1.25):
+
+    previousParameters = previousResults.get('parameters', {})
+    differentParameters = [name for name in sorted(set(results['parameters']) | set(previousParameters))
+                           if results['parameters'].get(name) != previousParameters.get(name)]
+
+    if differentParameters:
+        print('Not comparing with the previous results, which were run with different parameters: '
+              + ', '.join(name + ' ' + str(previousParameters.get(name)) + ' before, ' + str(results['parameters'].get(name)) + ' now'
+                          for name in differentParameters))
+        return
+
+    previousRuns = {run['sizes']['papers']: run for run in previousResults['runs']}
+
+    for run in results['runs']:
+
+        previousRun = previousRuns.get(run['sizes']['papers'])
+
+        if previousRun is None:
+            continue
+
+        for stage, measurement in run['stages'].items():
+
+            if stage in previousRun['stages'] and previousRun['stages'][stage]['seconds'] > 0:
+
+                ratio = measurement['seconds'] / previousRun['stages'][stage]['seconds']
+                print(str(run['sizes']['papers']) + ' papers, ' + stage + ': ' + format(ratio, '.2f') + ' x previous' + (' (slower)' if ratio > tolerance else ''))
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Time and memory-profile each stage of the calculation on synthetic EPPI reviewer exports')
+    parser.add_argument('--papers', type=int, nargs='+', default=[100, 1000], help='numbers of papers to benchmark, one run each (default 100 1000)')
+    parser.add_argument('--depth', type=int, default=3, help='depth of the codeset tree (default 3)')
+    parser.add_argument('--width', type=int, default=4, help='number of children of every attribute above the deepest level (default 4)')
+    parser.add_argument('--arms', type=int, default=0, help='number of arms of every paper, 0 for whole-study coding only (default 0)')
+    parser.add_argument('--density', type=float, default=0.1, help='share of the cells that are coded (default 0.1)')
+    parser.add_argument('--coders', type=int, default=2, help='number of coders (default 2)')
+    parser.add_argument('--text-length', type=int, default=40, help='length in characters of every annotated text (default 40)')
+    parser.add_argument('--agreement', type=float, default=0.8, help='chance that a coder agrees with the synthetic coding (default 0.8)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic exports (default 0)')
+    parser.add_argument('--repeat', type=int, default=3, help='number of timed runs of every stage; the fastest is reported (default 3)')
+    parser.add_argument('--output', default='benchmark_results.json', help='JSON file the results are written to (default benchmark_results.json)')
+    parser.add_argument('--keep-exports', metavar='DIRECTORY', help='write the synthetic exports to this directory and keep them')
+    parser.add_argument('--compare', metavar='PREVIOUS_RESULTS', help='JSON file of earlier results to compare the stage times with')
+    arguments = parser.parse_args(argv)
+
+    parameters = {'depth': arguments.depth, 'width': arguments.width, 'arms': arguments.arms, 'density': arguments.density,
+                  'coders': arguments.coders, 'textLength': arguments.text_length, 'agreement': arguments.agreement,
+                  'seed': arguments.seed, 'repeat': arguments.repeat}
+
+    results = {'parameters': parameters,
+               'environment': {'python': platform.python_version(), 'numpy': np.__version__, 'platform': platform.platform()},
+               'runs': []}
+
+    with tempfile.TemporaryDirectory() as temporaryDirectory:
+
+        for papers in arguments.papers:
+
+            exportDirectory = arguments.keep_exports or temporaryDirectory
+            os.makedirs(exportDirectory, exist_ok=True)
+
+            jsonFileNames = writeSyntheticExports(exportDirectory, papers, arguments.depth, arguments.width, arguments.arms, arguments.density,
+                                                  arguments.coders, arguments.text_length, arguments.agreement, arguments.seed,
+                                                  filePrefix='Synthetic' + str(papers))
+
+            run = benchmarkExports(jsonFileNames, arguments.repeat, temporaryDirectory)
+            results['runs'].append(run)
+
+            print(str(papers) + ' papers: ' + ', '.join(stage + ' ' + format(measurement['seconds'], '.3f') + 's'
+                                                        for stage, measurement in run['stages'].items()))
+
+    with open(arguments.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    if arguments.compare is not None:
+
+        with open(arguments.compare) as f:
+            compareResults(results, json.load(f))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+########################################################################################################################
+#   The command line of the inter-rater reliability calculation. Only argparse is imported up front; the rest of the
+#   package is imported once the arguments have been parsed
+########################################################################################################################
+
+
+import argparse
+import os
+
+# the main function parses the command line and runs one job with runJob. coderGroups, resultsFileName, writeSpreadsheets and
+# computePairwiseAlpha are the defaults used when the command line does not give them, so a script can keep its own settings
+
+def main(argv=None, coderGroups=None, resultsFileName='IRR_PythonScript_Results.csv', writeSpreadsheets=True, computePairwiseAlpha=False):
+
+    parser = argparse.ArgumentParser(description='Calculate inter-rater reliability from JSON files exported from EPPI reviewer')
+    parser.add_argument('--group', action='append', nargs='+', dest='groups', metavar='JSON_FILE', help='the JSON files of one group, one per coder; give --group once for every group')
+    parser.add_argument('--output-dir', default='.', help='directory the output files are written to (default the current directory)')
+    parser.add_argument('--pairwise-alpha', action='store_true', default=computePairwiseAlpha, help='also give the alpha values of every pair of coders')
+    parser.add_argument('--columnar', choices=['parquet', 'arrow'], help='also write the spreadsheets as one dictionary-encoded Parquet or Arrow IPC table (needs pyarrow)')
+    parser.add_argument('--no-spreadsheets', action='store_false', default=writeSpreadsheets, dest='spreadsheets', help='do not write the binary and text spreadsheets')
+    parser.add_argument('--workers', type=int, default=1, help='number of processes used to parse and merge the groups of JSON files')
+    parser.add_argument('--cache-dir', help='directory of a cache of parsed exports and merged groups, keyed by file content')
+    parser.add_argument('--cache-size', type=int, default=1024, help='maximum size of the cache in megabytes (default 1024)')
+    parser.add_argument('--incremental', metavar='STATE_FILE', help='file holding the state of the last run; only papers that changed since then are merged again')
+    parser.add_argument('--bootstrap', type=int, default=0, metavar='REPLICATES', help='number of bootstrap replicates used for confidence intervals of alpha (default 0, no intervals)')
+    parser.add_argument('--confidence', type=float, default=0.95, help='confidence level of the bootstrap intervals (default 0.95)')
+    parser.add_argument('--seed', type=int, help='seed of the bootstrap random number generator')
+    parser.add_argument('--text-agreement', action='store_true', help='also give the exact match, token Jaccard index and character overlap of the annotated text of each attribute')
+    parser.add_argument('--levels', metavar='LEVELS_FILE', help='csv file of AttributeIds or attribute titles and their level of measurement (nominal, ordinal, interval or ratio); the alpha of an attribute that is not nominal is computed from the first number in each coder\'s text')
+    parser.add_argument('--hierarchy', action='store_true', help='also write the alpha value of every node of the codeset trees, where a parent counts as coded when any descendant is')
+    parser.add_argument('--report', nargs='?', const='', metavar='REPORT_FILE', help='write the time, memory and counts of every stage as JSON lines (default IRR_PythonScript_Report.jsonl in the output directory)')
+    parser.add_argument('--trace-memory', action='store_true', help='also follow the memory of every stage in the report with tracemalloc, which slows the run down')
+    parser.add_argument('--profile', metavar='PROFILE_FILE', help='profile the whole run with cProfile and write the statistics to this file')
+    arguments = parser.parse_args(argv)
+
+    if arguments.groups is not None:
+        coderGroups = arguments.groups
+
+    if not coderGroups:
+        parser.error('no JSON files given; use --group once for every group of JSON files')
+
+    if any(len(coderFiles) < 2 for coderFiles in coderGroups):
+        parser.error('Every group must list at least two JSON files, one per coder')
+
+    if not 0 < arguments.confidence < 1:
+        parser.error('--confidence must be between 0 and 1, such as 0.95')
+
+    if arguments.bootstrap < 0:
+        parser.error('--bootstrap must not be negative')
+
+    from .api import reportFileName, runJob
+    from .exports import ExportCache
+    from .instrumentation import StageRecorder, noStageRecorder
+    from .levels import readAttributeLevels
+
+    if arguments.cache_dir is not None:
+        cache = ExportCache(arguments.cache_dir, arguments.cache_size * 1024 * 1024)
+    else:
+        cache = None
+
+    if arguments.report is not None:
+        recorder = StageRecorder(arguments.report or os.path.join(arguments.output_dir, reportFileName), arguments.trace_memory)
+    else:
+        recorder = noStageRecorder
+
+    if arguments.levels is not None:
+        attributeLevels = readAttributeLevels(arguments.levels)
+    else:
+        attributeLevels = None
+
+    if arguments.profile is not None:
+        import cProfile
+        profile = cProfile.Profile()
+        profile.enable()
+
+    try:
+        jobResult = runJob(coderGroups, arguments.output_dir, resultsFileName, arguments.spreadsheets, arguments.pairwise_alpha, arguments.workers,
+                           cache, arguments.incremental, arguments.bootstrap, arguments.confidence, arguments.seed, arguments.text_agreement,
+                           arguments.hierarchy, recorder, arguments.columnar, attributeLevels)
+    finally:
+        recorder.close()
+        if arguments.profile is not None:
+            profile.disable()
+            profile.dump_stats(arguments.profile)
+
+    # The code below reports the results of the codeset check, comparing the JSON files of every pair of coders in every group
+
+    for comparison in jobResult.comparisons:
+        print("It is " + str(comparison.review1Codenames == comparison.review2Codenames) + ' that the codenames are the same')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,232 @@
+########################################################################################################################
+#   The codeset of an export as a flat list and as a CodesetTree, and the check that the coders' codesets agree
+########################################################################################################################
+
+
+import numpy as np
+from collections import Counter, namedtuple
+from itertools import combinations
+
+#   the getCodeSet function takes a parsed export and returns a list where the first element is a list of codeIDs, and
+#   the second element is a list containing a list for each attribute where the first element is the attributeID and
+#   the second is the attribute name
+
+def getCodeSet(reviewExport):
+
+    codeSetList = []
+    codeIDs = []
+    codeNames = []
+
+    def recursiveCodesParser(codeSetJsonDict):
+
+        for attribute in codeSetJsonDict['Attributes']['AttributesList']:
+
+            codeSetList.append([attribute['AttributeId'], attribute['AttributeName']])
+            codeIDs.append(attribute['AttributeId'])
+            codeNames.append(attribute['AttributeName'])
+
+            if 'Attributes' in attribute:
+
+                recursiveCodesParser(attribute)
+
+        return [codeIDs, codeSetList, codeNames]
+
+    codeSetList = recursiveCodesParser(reviewExport.codeSets[0])
+
+    return codeSetList
+
+#   the CodesetTree class keeps the attribute trees of one or more codesets as arrays indexed in preorder, so the descendants of node i
+#   are the nodes i + 1 to subtreeEnds[i] - 1. Nodes are found by (SetId, AttributeId) in nodeNumbers, and each distinct SetId is only
+#   added once however many groups share it
+
+class CodesetTree:
+
+    def __init__(self):
+
+        self.setIds = []
+        self.setNames = []
+        self.attributeIds = []
+        self.attributeNames = []
+        self.parents = []
+        self.depths = []
+        self.subtreeEnds = []
+        self.nodeNumbers = {}
+
+    def addCodeSet(self, codeSet):
+
+        if any(setId == codeSet['SetId'] for setId in self.setIds):
+            return
+
+        def recursiveNodeParser(codeSetJsonDict, parent, depth):
+
+            for attribute in codeSetJsonDict['Attributes']['AttributesList']:
+
+                node = len(self.attributeIds)
+
+                self.setIds.append(codeSet['SetId'])
+                self.setNames.append(codeSet['SetName'])
+                self.attributeIds.append(attribute['AttributeId'])
+                self.attributeNames.append(attribute['AttributeName'])
+                self.parents.append(parent)
+                self.depths.append(depth)
+                self.subtreeEnds.append(None)
+                self.nodeNumbers.setdefault((codeSet['SetId'], attribute['AttributeId']), node)
+
+                if 'Attributes' in attribute:
+
+                    recursiveNodeParser(attribute, node, depth + 1)
+
+                self.subtreeEnds[node] = len(self.attributeIds)
+
+        recursiveNodeParser(codeSet, -1, 0)
+
+    #   ancestorTable gives a nodes x (maximum depth + 1) array whose row for a node lists the node itself and then its ancestors up to
+    #   the root of its codeset, padded with -1
+
+    def ancestorTable(self):
+
+        ancestors = np.full((len(self.parents), max(self.depths, default=0) + 1), -1, dtype=np.intp)
+        ancestors[:, 0] = np.arange(len(self.parents))
+
+        for level in range(1, ancestors.shape[1]):
+            previous = ancestors[:, level - 1]
+            ancestors[:, level] = np.where(previous >= 0, np.array(self.parents + [-1], dtype=np.intp)[previous], -1)
+
+        return ancestors
+
+#   the getPapersForCoderJson function takes a parsed export and creates a list of lists where the first list is a list
+#   of paper IDs and the second is a list containing a pair for each paper where the first is the paper ID and the
+#   second is the short title
+
+def getPapersFromCoderJson(reviewExport):
+
+    listOfPapers = []
+    paperIDs = []
+    paperNames = []
+
+    for paper in reviewExport.papers:
+
+        listOfPapers.append([paper[0], paper[1]])
+        paperIDs.append(paper[0])
+        paperNames.append(paper[1])
+
+    return [paperIDs, listOfPapers, paperNames]
+
+#   the getPapersFromCoderGroup function gives the [paper ID, short title] pair of every paper in any of a group of parsed exports: the
+#   papers of the first export in its order, then those of each later export whose paper ID no earlier export has. A paper listed more
+#   than once in an export is given once for every time it is listed, as getPapersFromCoderJson gives it
+
+def getPapersFromCoderGroup(coderExports):
+
+    listOfPapers = []
+    seenPaperIDs = set()
+
+    for coderExport in coderExports:
+
+        exportPapers = getPapersFromCoderJson(coderExport)[1]
+
+        listOfPapers.extend(paper for paper in exportPapers if paper[0] not in seenPaperIDs)
+        seenPaperIDs.update(paper[0] for paper in exportPapers)
+
+    return listOfPapers
+
+# getCodenamesDiscrepancies compares the codesets to give the entities present in one codeset but not in the other and vice versa. It also checks
+# whether there are any duplicate attribute names or IDs within the codesets and which IDs have a different name in each codeset. The
+# comparison uses sets and Counters so it stays linear for large taxonomies, and the caller's lists are left untouched. The result is a
+# CodesetComparison which the comparisonText function turns into the text written to fileComparison.txt
+
+CodesetComparison = namedtuple('CodesetComparison', [
+    'review1IDs', 'review2IDs', 'review1Codenames', 'review2Codenames',
+    'namesInReview1NotReview2', 'namesInReview2NotReview1', 'IDsInReview1NotReview2', 'IDsInReview2NotReview1',
+    'nameDuplicatesReview1', 'nameDuplicatesReview2', 'IDDuplicatesReview1', 'IDDuplicatesReview2', 'renamedIDs'])
+
+def getCodenameDiscrepancies(codenamesForReview1, codenamesForReview2, review1IDs, review2IDs):
+
+    review1IDs = [str(codeID) for codeID in review1IDs]
+    review2IDs = [str(codeID) for codeID in review2IDs]
+
+    codenamesSetReview1 = set(codenamesForReview1)
+    codenamesSetReview2 = set(codenamesForReview2)
+    IDsSetReview1 = set(review1IDs)
+    IDsSetReview2 = set(review2IDs)
+
+    def duplicates(values):
+
+        return [value for value, count in Counter(values).items() for _ in range(count - 1)]
+
+    #   an ID is renamed when it appears in both codesets under a different name; the first name given to an ID is used
+
+    codenameByIDReview2 = {}
+
+    for codeID, codename in zip(review2IDs, codenamesForReview2):
+        codenameByIDReview2.setdefault(codeID, codename)
+
+    renamedIDs = []
+    seenIDs = set()
+
+    for codeID, codename in zip(review1IDs, codenamesForReview1):
+
+        if codeID in codenameByIDReview2 and codeID not in seenIDs and codenameByIDReview2[codeID] != codename:
+            renamedIDs.append([codeID, codename, codenameByIDReview2[codeID]])
+
+        seenIDs.add(codeID)
+
+    return CodesetComparison(
+        review1IDs, review2IDs, list(codenamesForReview1), list(codenamesForReview2),
+        [codename for codename in codenamesForReview1 if codename not in codenamesSetReview2],
+        [codename for codename in codenamesForReview2 if codename not in codenamesSetReview1],
+        [codeID for codeID in review1IDs if codeID not in IDsSetReview2],
+        [codeID for codeID in review2IDs if codeID not in IDsSetReview1],
+        duplicates(codenamesForReview1), duplicates(codenamesForReview2),
+        duplicates(review1IDs), duplicates(review2IDs),
+        renamedIDs)
+
+# the comparisonText function produces the fileComparison.txt text for a CodesetComparison
+
+def comparisonText(comparison):
+
+    renamedText = ', '.join(codeID + ' (' + codename1 + ' / ' + codename2 + ')' for codeID, codename1, codename2 in comparison.renamedIDs)
+
+    textFile = 'It is ' + str(comparison.review1IDs == comparison.review2IDs) + ' that the codeIDs are the same. There are ' + str(len(comparison.review1IDs)) + ' IDs for review 1 and there are ' + str(len(comparison.review2IDs)) + ' IDs for review 2 \n\n' + 'There are, ' + str((len(comparison.review1Codenames))) + ' codenames for review 1. There are, ' + str((len(comparison.review2Codenames))) + ' codenames for review 2.\n\n' + 'It is ' + str(comparison.review1Codenames == comparison.review2Codenames) + ' that the codenames are the same. The attribute names that are in codeset 1 but not codeset 2 are: ' + ', '.join(comparison.namesInReview1NotReview2) + '\n\n' + 'The attribute names that are in codeset 2 but not in codeset 1 are: ' + ', '.join(comparison.namesInReview2NotReview1) + '\n\n' + 'The IDs that are in codeset1 but not codeset 2 are: ' + ', '.join(comparison.IDsInReview1NotReview2) + '\n\nThe IDs that are in codeset2 but not codeset 1 are: ' + ', '.join(comparison.IDsInReview2NotReview1) + '\n\n' + 'The duplicate names in codeset1 are, ' + ', '.join(comparison.nameDuplicatesReview1) + '\n\n' + 'The duplicate names in codeset2 are, ' + ', '.join(comparison.nameDuplicatesReview2) + '\n\nThe ID duplicates in codeset 1 are, ' + ', '.join(comparison.IDDuplicatesReview1) + '\n\nThe ID duplicates in codeset 2 are, ' + ', '.join(comparison.IDDuplicatesReview2) + '\n\nThe IDs with a different name in codeset 1 and codeset 2 are, ' + renamedText
+
+    return textFile
+
+#The checkCodesetGroup function runs the getCodenameDiscrepencies function on every pair of coders' exports of a group, so a difference
+#between any two coders is reported, and adds the review names to the output text. Each codeset is only flattened once. It returns the
+#CodesetComparison for each pair, in the order of itertools.combinations, along with the text
+
+def checkCodesetGroup(coderExports):
+
+    comparisons = []
+    overallText = ''
+
+    coderCodeSets = [getCodeSet(coderExport) for coderExport in coderExports]
+
+    for coder1, coder2 in combinations(range(len(coderExports)), 2):
+
+        review1CodeSet = coderCodeSets[coder1]
+        review2CodeSet = coderCodeSets[coder2]
+
+        comparison = getCodenameDiscrepancies(review1CodeSet[2], review2CodeSet[2], review1CodeSet[0], review2CodeSet[0])
+
+        comparisons.append(comparison)
+
+        overallText = overallText + 'Comparing ' + coderExports[coder1].fileName + ' and ' + coderExports[coder2].fileName + ':\n\n' + comparisonText(comparison) + '\n\n****************\n\n'
+
+    return [comparisons, overallText]
+
+#The checkCodesets function runs checkCodesetGroup on every group of JSON files in coderGroups and joins the results
+
+def checkCodesets(reviewExports, coderGroups):
+
+    comparisons = []
+    overallText = ''
+
+    for coderFiles in coderGroups:
+
+        groupComparisons, groupText = checkCodesetGroup([reviewExports[coderFile] for coderFile in coderFiles])
+
+        comparisons = comparisons + groupComparisons
+        overallText = overallText + groupText
+
+    return [comparisons, overallText]
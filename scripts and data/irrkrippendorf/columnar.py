@@ -0,0 +1,115 @@
+########################################################################################################################
+#   The binary and text spreadsheets as one columnar table, in Parquet or Arrow IPC format, for readers that memory-map
+#   the table or filter it by attribute instead of parsing csv. pyarrow is only needed when this output is asked for
+########################################################################################################################
+
+
+import os
+from contextlib import contextmanager
+
+columnarFileNames = {'parquet': 'IrrSpreadsheet.parquet', 'arrow': 'IrrSpreadsheet.arrow'}
+
+#   the ColumnarWriter class writes the rows of mergeCoderRows to fileName as they are produced, one record batch of batchSize rows at a
+#   time. The table has a column for each column of the spreadsheets, with the binary values of each coder as int8 and their text as
+#   strings. The short title, attribute title and arm title columns are dictionary encoded, with one dictionary for the whole file that
+#   grows as new titles appear, so every batch shares the indices of the earlier ones
+
+class ColumnarWriter:
+
+    def __init__(self, fileName, numberOfCoders, fileFormat='parquet', batchSize=65536):
+
+        try:
+            import pyarrow
+        except ImportError:
+            raise ImportError('writing the spreadsheets as ' + fileFormat + ' needs the pyarrow package (pip install pyarrow)') from None
+
+        if fileFormat not in columnarFileNames:
+            raise ValueError('unknown columnar format ' + repr(fileFormat) + ', expected one of ' + ', '.join(columnarFileNames))
+
+        self.pyarrow = pyarrow
+        self.numberOfCoders = numberOfCoders
+        self.batchSize = batchSize
+
+        dictionaryType = pyarrow.dictionary(pyarrow.int32(), pyarrow.string())
+
+        self.schema = pyarrow.schema([('paperID', pyarrow.int64()), ('shortTitle', dictionaryType), ('AttributeId', pyarrow.int64()),
+                                      ('AttributeTitle', dictionaryType), ('ArmTitle', dictionaryType)]
+                                     + [('Coder' + str(coder + 1), pyarrow.int8()) for coder in range(numberOfCoders)]
+                                     + [('Coder' + str(coder + 1) + 'Text', pyarrow.string()) for coder in range(numberOfCoders)])
+
+        self.dictionaries = {columnName: {} for columnName in ['shortTitle', 'AttributeTitle', 'ArmTitle']}
+
+        if fileFormat == 'parquet':
+            import pyarrow.parquet
+            self.writer = pyarrow.parquet.ParquetWriter(fileName, self.schema)
+        else:
+            import pyarrow.ipc
+            self.writer = pyarrow.ipc.new_file(fileName, self.schema, options=pyarrow.ipc.IpcWriteOptions(emit_dictionary_deltas=True))
+
+        self.clearBatch()
+
+    def clearBatch(self):
+
+        self.paperIDs = []
+        self.attributeIds = []
+        self.indices = {columnName: [] for columnName in self.dictionaries}
+        self.coderValues = [[] for coder in range(self.numberOfCoders)]
+        self.coderTexts = [[] for coder in range(self.numberOfCoders)]
+
+    def writerow(self, binaryRow, textRow):
+
+        self.paperIDs.append(binaryRow[0])
+        self.attributeIds.append(binaryRow[2])
+
+        for columnName, value in zip(self.dictionaries, (binaryRow[1], binaryRow[3], binaryRow[4])):
+            dictionary = self.dictionaries[columnName]
+            self.indices[columnName].append(dictionary.setdefault(value, len(dictionary)))
+
+        for coder in range(self.numberOfCoders):
+            self.coderValues[coder].append(int(binaryRow[5 + coder]))
+            self.coderTexts[coder].append(textRow[5 + coder])
+
+        if len(self.paperIDs) >= self.batchSize:
+            self.writeBatch()
+
+    def writeBatch(self):
+
+        if not self.paperIDs:
+            return
+
+        pyarrow = self.pyarrow
+
+        dictionaryArrays = {columnName: pyarrow.DictionaryArray.from_arrays(pyarrow.array(self.indices[columnName], pyarrow.int32()),
+                                                                            pyarrow.array(list(self.dictionaries[columnName]), pyarrow.string()))
+                            for columnName in self.dictionaries}
+
+        columns = ([pyarrow.array(self.paperIDs, pyarrow.int64()), dictionaryArrays['shortTitle'], pyarrow.array(self.attributeIds, pyarrow.int64()),
+                    dictionaryArrays['AttributeTitle'], dictionaryArrays['ArmTitle']]
+                   + [pyarrow.array(values, pyarrow.int8()) for values in self.coderValues]
+                   + [pyarrow.array(texts, pyarrow.string()) for texts in self.coderTexts])
+
+        self.writer.write_batch(pyarrow.record_batch(columns, schema=self.schema))
+
+        self.clearBatch()
+
+    def close(self):
+
+        self.writeBatch()
+        self.writer.close()
+
+# the columnarSpreadsheetWriter function gives a ColumnarWriter for the file of fileFormat in outputDirectory and closes it at the end of
+# the with block, or gives None when fileFormat is None
+
+@contextmanager
+def columnarSpreadsheetWriter(numberOfCoders, outputDirectory, fileFormat=None):
+
+    if fileFormat is None:
+        yield None
+        return
+
+    writer = ColumnarWriter(os.path.join(outputDirectory, columnarFileNames[fileFormat]), numberOfCoders, fileFormat)
+
+    try:
+        yield writer
+    finally:
+        writer.close()
@@ -0,0 +1,451 @@
+########################################################################################################################
+#   Parsing of the JSON files exported from EPPI reviewer into ReviewExports, and the ExportCache of parsed exports
+########################################################################################################################
+
+
+import hashlib
+import json
+import os
+import pickle
+from array import array
+from collections import namedtuple
+
+#   the ExportStreamReader class reads an EPPI reviewer export incrementally instead of decoding the whole document
+#   with json.load. The References array is walked one reference at a time and each one is reduced to a small
+#   ReferenceRecord holding the paper ID, short title and a CodeRecord for each code, so memory stays flat no matter how
+#   many references the export holds. The CodeSets tree is decoded separately when the reader reaches it and is kept
+#   on the reader as codeSets. Each text detail of a code keeps its arm, its text and its offsets, a tuple of the
+#   ItemDocumentId, TextFrom and TextTo, which are zero for PDF annotations
+
+ReferenceRecord = namedtuple('ReferenceRecord', ['itemId', 'shortTitle', 'codes'])
+CodeRecord = namedtuple('CodeRecord', ['attributeId', 'armTitle', 'textDetails'])
+
+class ExportStreamReader:
+
+    def __init__(self, jsonFileName, chunkSize=65536):
+
+        self.fileName = jsonFileName
+        self.chunkSize = chunkSize
+        self.codeSets = None
+        self.decoder = json.JSONDecoder()
+
+    #   the references generator yields a ReferenceRecord for each entry of the References array in file order
+
+    def references(self):
+
+        with open(self.fileName, encoding="utf8") as f:
+
+            self.file = f
+            self.buffer = ''
+            self.position = 0
+            self.endOfFile = False
+
+            self.expect('{')
+
+            if self.peek() == '}':
+                return
+
+            while True:
+
+                key = self.decodeValue()
+                self.expect(':')
+
+                if key == 'References':
+
+                    yield from self.referencesArray()
+
+                elif key == 'CodeSets':
+
+                    self.codeSets = self.decodeValue()
+
+                else:
+
+                    self.decodeValue()
+
+                if self.peek() == '}':
+                    break
+
+                self.expect(',')
+
+    def referencesArray(self):
+
+        self.expect('[')
+
+        if self.peek() == ']':
+            self.position += 1
+            return
+
+        while True:
+
+            reference = self.decodeValue()
+
+            codes = []
+
+            for code in reference.get('Codes', []):
+
+                if 'ItemAttributeFullTextDetails' in code:
+                    textDetails = [(detail['ItemArm'], detail['Text'], (detail.get('ItemDocumentId', 0), detail.get('TextFrom', 0), detail.get('TextTo', 0)))
+                                   for detail in code['ItemAttributeFullTextDetails']]
+                else:
+                    textDetails = None
+
+                codes.append(CodeRecord(code['AttributeId'], code['ArmTitle'], textDetails))
+
+            yield ReferenceRecord(reference['ItemId'], reference['ShortTitle'], codes)
+
+            if self.peek() == ']':
+                self.position += 1
+                return
+
+            self.expect(',')
+
+    #   readChunk drops the part of the buffer that has already been decoded and appends the next chunk of the file.
+    #   The chunk grows with the buffer so a single large value (such as the CodeSets tree) is not re-scanned many times
+
+    def readChunk(self):
+
+        chunk = self.file.read(max(self.chunkSize, len(self.buffer) - self.position))
+
+        if not chunk:
+            self.endOfFile = True
+            return False
+
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+
+        return True
+
+    def peek(self):
+
+        while True:
+
+            while self.position < len(self.buffer) and self.buffer[self.position] in ' \t\n\r':
+                self.position += 1
+
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+
+            if not self.readChunk():
+                raise ValueError('Unexpected end of file in ' + self.fileName)
+
+    def expect(self, character):
+
+        if self.peek() != character:
+            raise ValueError('Expected ' + repr(character) + ' in ' + self.fileName + ' but found ' + repr(self.buffer[self.position]))
+
+        self.position += 1
+
+    #   decodeValue decodes the next JSON value. A value that runs past the end of the buffer is retried once more of
+    #   the file has been read; a number touching the end of the buffer is also retried, since it may be cut short
+
+    def decodeValue(self):
+
+        self.peek()
+
+        while True:
+
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                if not self.readChunk():
+                    raise
+                continue
+
+            if end == len(self.buffer) and not self.endOfFile and self.readChunk():
+                continue
+
+            self.position = end
+
+            return value
+
+#   the ReviewExport class holds one parsed EPPI reviewer export. The JSON file is streamed once when the object is
+#   created and the codeset tree, the papers and the annotations are then shared by every stage of the script
+
+class ReviewExport:
+
+    def __init__(self, jsonFileName):
+
+        reader = ExportStreamReader(jsonFileName)
+
+        self.fileName = jsonFileName
+        self.papers = []
+        self.annotations = AnnotationTable()
+
+        for reference in reader.references():
+
+            self.papers.append([reference.itemId, reference.shortTitle])
+            self.annotations.addPaper(reference.itemId, annotationsParser(reference))
+
+        self.codeSets = reader.codeSets
+
+#   the ExportCache class is an on-disk cache of parsed exports and merged groups. Entries are keyed by the SHA-256 hash
+#   of each JSON file's content together with parserVersion, so a changed file or a change to the parsing code gives a new
+#   key, and they are stored as pickles. A run where nothing changed therefore never decodes any JSON. Reading an entry
+#   marks it as recently used, and whenever the cache grows past maximumSize bytes the least recently used entries are
+#   removed. parserVersion must be increased whenever the parsed or merged structures change
+
+parserVersion = 6
+
+class ExportCache:
+
+    def __init__(self, cacheDirectory, maximumSize=1024 * 1024 * 1024):
+
+        self.cacheDirectory = cacheDirectory
+        self.maximumSize = maximumSize
+        self.fileHashes = {}
+
+        os.makedirs(cacheDirectory, exist_ok=True)
+
+        self.evict()
+
+    def fileHash(self, jsonFileName):
+
+        if jsonFileName not in self.fileHashes:
+
+            contentHash = hashlib.sha256()
+
+            with open(jsonFileName, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    contentHash.update(chunk)
+
+            self.fileHashes[jsonFileName] = contentHash.hexdigest()
+
+        return self.fileHashes[jsonFileName]
+
+    #   exportKey identifies the parsed export of one file's content. groupKey identifies the merged rows of a group of
+    #   files and includes the file names as well, since they appear in the comparison text
+
+    def exportKey(self, jsonFileName):
+
+        return 'export-' + str(parserVersion) + '-' + self.fileHash(jsonFileName)
+
+    def groupKey(self, coderFiles):
+
+        groupHash = hashlib.sha256(str(parserVersion).encode('utf8'))
+
+        for coderFile in coderFiles:
+            groupHash.update((coderFile + '\0' + self.fileHash(coderFile) + '\0').encode('utf8'))
+
+        return 'group-' + str(parserVersion) + '-' + groupHash.hexdigest()
+
+    def load(self, key):
+
+        entryFileName = os.path.join(self.cacheDirectory, key + '.pickle')
+
+        try:
+            with open(entryFileName, 'rb') as f:
+                value = pickle.load(f)
+            os.utime(entryFileName)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            return None
+
+        return value
+
+    #   store writes to a temporary file first and renames it, so another process never reads a partly written entry
+
+    def store(self, key, value):
+
+        entryFileName = os.path.join(self.cacheDirectory, key + '.pickle')
+        temporaryFileName = entryFileName + '.' + str(os.getpid()) + '.tmp'
+
+        with open(temporaryFileName, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        os.replace(temporaryFileName, entryFileName)
+
+        self.evict()
+
+    def evict(self):
+
+        entries = []
+
+        for entryName in os.listdir(self.cacheDirectory):
+
+            if entryName.endswith('.pickle'):
+
+                try:
+                    entryStat = os.stat(os.path.join(self.cacheDirectory, entryName))
+                except OSError:
+                    continue
+
+                entries.append([entryStat.st_mtime, entryStat.st_size, entryName])
+
+        totalSize = sum(entry[1] for entry in entries)
+
+        for lastUsed, size, entryName in sorted(entries):
+
+            if totalSize <= self.maximumSize:
+                break
+
+            try:
+                os.remove(os.path.join(self.cacheDirectory, entryName))
+            except OSError:
+                pass
+
+            totalSize -= size
+
+#   the AnnotationTable class is the compact store of one export's annotations. Only coded cells are kept, one per paper,
+#   attribute and arm, as parallel arrays of the attribute ID, an interned arm number, a small integer status and the
+#   number of the cell's list of annotated texts, whose offsets are kept at the same number in textOffsets. The cells of
+#   each paper are stored together, and paperCells gives the range of cells of each paper ID. An attribute that was coded
+#   with no arms is kept as a cell with arm number -1
+
+statusNothingCoded = 0
+statusTickedNoValue = 1
+statusText = 2
+
+class AnnotationTable:
+
+    def __init__(self):
+
+        self.armTitles = []
+        self.armNumbers = {}
+        self.cellAttribute = array('q')
+        self.cellArm = array('l')
+        self.cellStatus = array('b')
+        self.cellText = array('l')
+        self.texts = []
+        self.textOffsets = []
+        self.paperCells = {}
+
+    #   addPaper appends the cells of one paper from the nested dictionary given by annotationsParser. A paper ID seen
+    #   again replaces the earlier paper, as a later reference with the same ItemId did in the nested dictionaries
+
+    def addPaper(self, itemId, paperDict):
+
+        start = len(self.cellAttribute)
+
+        for attributeId, armDict in paperDict.items():
+
+            if not armDict:
+                self.addCell(attributeId, -1, statusNothingCoded, -1)
+
+            for arm, value in armDict.items():
+
+                if arm not in self.armNumbers:
+                    self.armNumbers[arm] = len(self.armTitles)
+                    self.armTitles.append(arm)
+
+                if value == "code ticked with no value":
+                    self.addCell(attributeId, self.armNumbers[arm], statusTickedNoValue, -1)
+                else:
+                    self.addCell(attributeId, self.armNumbers[arm], statusText, len(self.texts))
+                    self.texts.append([text for text, offsets in value])
+                    self.textOffsets.append(tuple(offsets for text, offsets in value))
+
+        self.paperCells[itemId] = (start, len(self.cellAttribute))
+
+    def addCell(self, attributeId, armNumber, status, textNumber):
+
+        self.cellAttribute.append(attributeId)
+        self.cellArm.append(armNumber)
+        self.cellStatus.append(status)
+        self.cellText.append(textNumber)
+
+    #   attributeCells gives the coded cells of one paper as a dictionary from attribute ID to a list of [arm title, status, texts,
+    #   offsets] in the order they were coded. It raises KeyError for a paper that is not in the export
+
+    def attributeCells(self, itemId):
+
+        start, end = self.paperCells[itemId]
+
+        attributeCells = {}
+
+        for cell in range(start, end):
+
+            arms = attributeCells.setdefault(self.cellAttribute[cell], [])
+
+            if self.cellArm[cell] >= 0:
+                textNumber = self.cellText[cell]
+                arms.append([self.armTitles[self.cellArm[cell]], self.cellStatus[cell], self.texts[textNumber] if textNumber >= 0 else None,
+                             self.textOffsets[textNumber] if textNumber >= 0 else None])
+
+        return attributeCells
+
+#   the loadReviewExports function creates a ReviewExport for each distinct file name so that files shared between
+#   several groups are still only parsed once per run. When an ExportCache is given, exports whose content has been
+#   parsed before are read from the cache instead
+
+def loadReviewExports(jsonFileNames, cache=None):
+
+    reviewExports = {}
+
+    for jsonFileName in jsonFileNames:
+
+        if jsonFileName not in reviewExports:
+
+            if cache is None:
+
+                reviewExports[jsonFileName] = ReviewExport(jsonFileName)
+
+            else:
+
+                reviewExport = cache.load(cache.exportKey(jsonFileName))
+
+                if reviewExport is None:
+                    reviewExport = ReviewExport(jsonFileName)
+                    cache.store(cache.exportKey(jsonFileName), reviewExport)
+
+                reviewExport.fileName = jsonFileName
+                reviewExports[jsonFileName] = reviewExport
+
+    return reviewExports
+
+#   the annotationsParser function parses the codes of one ReferenceRecord into a nested dictionary containing the text
+#   annotations for each attributeID and arm of that paper. Where there is more than one piece of text annotated for a
+#   particular attribute for a particular arm, these are appended to give one item for each attribute for each arm. Each
+#   piece of text is kept as a pair of the text and its offsets
+
+def annotationsParser(reference):
+
+    paperDict = {}
+
+    for code in reference.codes:    #loops through the codes for the paper
+
+        if code.attributeId not in paperDict:  #checks whether the code has already been seen for paper
+
+            armDict = {}
+
+            paperDict[code.attributeId] = armDict  #sets up a dict structure for the coder - attributeID = empty dict
+
+            if code.textDetails is not None:  #if code has been ticked
+
+                for i in range(len(code.textDetails)):  #loops through arms for attribute
+
+                    itemArm, text, offsets = code.textDetails[i]
+
+                    if i == 0:  #if it's the first arm, it creates an arm dict with the arm title and assigns value of the annotated text
+
+                        armDict[itemArm] = [(text, offsets)]
+
+                    else:   #if it's another arm it append to an arm dict with the name, as it's always another piece of text for that attribute, for that arm
+
+                        armDict[itemArm].append((text, offsets))
+
+            else:   #if there is no annotated text, the armdict>armtitle is assigned 'code ticked no value'
+
+                armDict[code.armTitle] = "code ticked with no value"
+
+        else:   #if the code has been seen for the paper
+
+            armDict = paperDict[code.attributeId]
+
+            if code.textDetails is not None:  #if it has text coded
+
+                for i in range(len(code.textDetails)):  #as above, but must be for diff arm
+
+                    itemArm, text, offsets = code.textDetails[i]
+
+                    if i == 0:
+
+                        armDict[itemArm] = [(text, offsets)]
+
+                    else:
+
+                        armDict[itemArm].append((text, offsets))
+
+            else:   #if no text coded assigned 'coder ticked with no value'
+
+                armDict[code.armTitle] = "code ticked with no value"
+
+    return paperDict
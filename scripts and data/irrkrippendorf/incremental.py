@@ -0,0 +1,229 @@
+########################################################################################################################
+#   The state kept between incremental runs, so only the papers that changed are merged again
+########################################################################################################################
+
+
+import hashlib
+import os
+import pickle
+import numpy as np
+from collections import Counter
+from itertools import combinations
+
+from .codesets import getCodeSet, getPapersFromCoderGroup
+from .exports import parserVersion
+from .merge import produceCsv
+from .reliability import alphaValuesFromCoincidences, coincidenceCountsByGroup, valueCountPatterns
+
+#   the IncrementalState class holds what an incremental run needs from the previous run: the rows produced for each paper of each group
+#   with a digest of the annotations they came from, and the running per-attribute coincidence matrices and annotated-row counts for all
+#   coders together and for every pair of coders, along with the value-count pattern counts of all coders used by the bootstrap. The
+#   update method diffs new exports against this per ItemId: only papers whose annotations, short title or codeset changed are merged
+#   again, and the coincidences of their old rows are subtracted and those of their new rows added, so the alpha values come from the
+#   updated totals without rescanning the unchanged rows. The coincidences are kept as whole-number pair counts, that is scaled by the
+#   number of coders less one, so adding and subtracting rows never drifts from the totals of a full run
+
+stateVersion = 2
+
+class IncrementalState:
+
+    def __init__(self, numberOfCoders):
+
+        self.parserVersion = parserVersion
+        self.stateVersion = stateVersion
+        self.numberOfCoders = numberOfCoders
+        self.coderSubsets = list(dict.fromkeys([tuple(range(numberOfCoders))] + list(combinations(range(numberOfCoders), 2))))
+        self.groups = []
+        self.attributeIndexByTitle = {}
+        self.titleRows = np.zeros(0)
+        self.titleOrder = []
+        self.coincidences = {coderSubset: np.zeros((0, 2, 2)) for coderSubset in self.coderSubsets}
+        self.annotatedRows = {coderSubset: np.zeros(0) for coderSubset in self.coderSubsets}
+        self.patternNumbers = {}
+        self.patternCounts = np.zeros((0, 0))
+
+    #   load returns the saved state, or a new empty state when there is none, it cannot be read or it was saved by a different parser
+    #   or state version or for a different number of coders, in which case the first update merges everything
+
+    @staticmethod
+    def load(stateFileName, numberOfCoders):
+
+        try:
+            with open(stateFileName, 'rb') as f:
+                state = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            return IncrementalState(numberOfCoders)
+
+        if state.parserVersion != parserVersion or getattr(state, 'stateVersion', None) != stateVersion or state.numberOfCoders != numberOfCoders:
+            return IncrementalState(numberOfCoders)
+
+        return state
+
+    def save(self, stateFileName):
+
+        temporaryFileName = stateFileName + '.' + str(os.getpid()) + '.tmp'
+
+        with open(temporaryFileName, 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        os.replace(temporaryFileName, stateFileName)
+
+    def update(self, reviewExports, coderGroups):
+
+        while len(self.groups) > len(coderGroups):
+            removedGroup = self.groups.pop()
+            self.applyRows([rows for paperKey in removedGroup['paperOrder'] for rows in removedGroup['rows'][paperKey]], -1)
+
+        for groupNumber in range(len(coderGroups)):
+
+            if groupNumber == len(self.groups):
+                self.groups.append({'codesetDigest': None, 'paperOrder': [], 'digests': {}, 'rows': {}})
+
+            self.updateGroup(self.groups[groupNumber], [reviewExports[coderFile] for coderFile in coderGroups[groupNumber]])
+
+        self.updateTitleOrder()
+
+    def updateGroup(self, group, coderExports):
+
+        codesetDigest = digest([[coderExport.fileName for coderExport in coderExports], getCodeSet(coderExports[0])[:2]])
+
+        paperOrder = [(paper[0], paper[1]) for paper in getPapersFromCoderGroup(coderExports)]
+        digests = {paperKey: digest([coderExport.annotations.attributeCells(paperKey[0]) if paperKey[0] in coderExport.annotations.paperCells else None for coderExport in coderExports]) for paperKey in paperOrder}
+
+        oldCounts = Counter(group['paperOrder'])
+        newCounts = Counter(paperOrder)
+
+        changedPapers = [paperKey for paperKey in newCounts if codesetDigest != group['codesetDigest'] or paperKey not in oldCounts
+                         or oldCounts[paperKey] != newCounts[paperKey] or group['digests'][paperKey] != digests[paperKey]]
+        changedPaperSet = set(changedPapers)
+
+        #   the rows of changed and removed papers are taken out of the totals, once for every time the paper appeared
+
+        oldRows = [rows for paperKey, count in oldCounts.items() if paperKey in changedPaperSet or paperKey not in newCounts
+                   for repeat in range(count) for rows in group['rows'][paperKey]]
+
+        self.applyRows(oldRows, -1)
+
+        newRowsByPaper = {}
+
+        for binaryRow, textRow in produceCsv(coderExports, {paperKey[0] for paperKey in changedPapers}):
+            paperKey = (binaryRow[0], binaryRow[1])
+            if paperKey in changedPaperSet:
+                newRowsByPaper.setdefault(paperKey, []).append((binaryRow, textRow))
+
+        #   produceCsv yields the rows of a repeated paper once for each time it appears, so only the first copy is kept
+
+        for paperKey in changedPapers:
+            newRowsByPaper[paperKey] = newRowsByPaper.get(paperKey, [])[:len(newRowsByPaper.get(paperKey, [])) // newCounts[paperKey]]
+
+        self.applyRows([rows for paperKey in changedPapers for repeat in range(newCounts[paperKey]) for rows in newRowsByPaper[paperKey]], 1)
+
+        for paperKey in oldCounts:
+            if paperKey not in newCounts:
+                del group['rows'][paperKey]
+                del group['digests'][paperKey]
+
+        group['rows'].update(newRowsByPaper)
+        group['digests'].update(digests)
+        group['paperOrder'] = paperOrder
+        group['codesetDigest'] = codesetDigest
+
+    #   applyRows adds (sign 1) or subtracts (sign -1) the coincidences and annotated-row counts of some rows to the running totals
+
+    def applyRows(self, rows, sign):
+
+        if not rows:
+            return
+
+        for binaryRow, textRow in rows:
+            self.attributeIndexByTitle.setdefault(binaryRow[3], len(self.attributeIndexByTitle))
+
+        numberOfTitles = len(self.attributeIndexByTitle)
+        attributeIndex = np.array([self.attributeIndexByTitle[binaryRow[3]] for binaryRow, textRow in rows], dtype=np.intp)
+
+        titleRows = np.zeros(numberOfTitles)
+        titleRows[:len(self.titleRows)] = self.titleRows
+        self.titleRows = titleRows + sign * np.bincount(attributeIndex, minlength=numberOfTitles)
+        reliabilityData = np.array([[int(binaryRow[5 + coder]) for binaryRow, textRow in rows] for coder in range(self.numberOfCoders)], dtype=np.float64)
+
+        for coderSubset in self.coderSubsets:
+
+            coincidences = np.zeros((numberOfTitles, 2, 2))
+            coincidences[:len(self.coincidences[coderSubset])] = self.coincidences[coderSubset]
+
+            annotatedRows = np.zeros(numberOfTitles)
+            annotatedRows[:len(self.annotatedRows[coderSubset])] = self.annotatedRows[coderSubset]
+
+            subsetData = reliabilityData[list(coderSubset)]
+
+            self.coincidences[coderSubset] = coincidences + sign * coincidenceCountsByGroup(subsetData, attributeIndex, numberOfTitles, pairCounts=True)
+            self.annotatedRows[coderSubset] = annotatedRows + sign * np.bincount(attributeIndex, weights=(subsetData == 1).any(axis=0), minlength=numberOfTitles)
+
+        patterns, rowPatternCounts = valueCountPatterns(reliabilityData, attributeIndex, numberOfTitles)
+
+        for pattern in patterns:
+            self.patternNumbers.setdefault(tuple(pattern), len(self.patternNumbers))
+
+        patternCounts = np.zeros((numberOfTitles, len(self.patternNumbers)))
+        patternCounts[:self.patternCounts.shape[0], :self.patternCounts.shape[1]] = self.patternCounts
+        patternCounts[:, [self.patternNumbers[tuple(pattern)] for pattern in patterns]] += sign * rowPatternCounts
+
+        self.patternCounts = patternCounts
+
+    #   groupRows gives the rows of each group in paper order, as produceCsv would have produced them
+
+    def groupRows(self):
+
+        return [[rows for paperKey in group['paperOrder'] for rows in group['rows'][paperKey]] for group in self.groups]
+
+    #   updateTitleOrder keeps the attribute titles that have rows in order of first appearance in the rows, as in mergeCoderRows. The rows
+    #   are read paper by paper only until every title with rows has been seen, which is usually within the first paper of each group
+
+    def updateTitleOrder(self):
+
+        titleOrder = {}
+        titlesWithRows = int((self.titleRows > 0).sum())
+
+        for group in self.groups:
+
+            for paperKey in group['paperOrder']:
+
+                if len(titleOrder) == titlesWithRows:
+                    break
+
+                for binaryRow, textRow in group['rows'][paperKey]:
+                    titleOrder.setdefault(binaryRow[3])
+
+        self.titleOrder = list(titleOrder)
+
+    def listOfAttributes(self):
+
+        return self.titleOrder
+
+    def alphaValues(self, coderSubset):
+
+        listOfAttributes = self.listOfAttributes()
+        titleIndex = [self.attributeIndexByTitle[title] for title in listOfAttributes]
+
+        coincidences = self.coincidences[coderSubset][titleIndex] / (len(coderSubset) - 1)
+
+        return alphaValuesFromCoincidences(listOfAttributes, coincidences, self.annotatedRows[coderSubset][titleIndex] > 0.5)
+
+    #   bootstrapPatterns gives the inputs of bootstrapIntervals for all coders, with the pattern counts in listOfAttributes order. The
+    #   patterns still in use are sorted as valueCountPatterns sorts them, so a seeded bootstrap gives the same intervals as a full run
+
+    def bootstrapPatterns(self):
+
+        listOfAttributes = self.listOfAttributes()
+        titleIndex = [self.attributeIndexByTitle[title] for title in listOfAttributes]
+
+        patternCounts = self.patternCounts[titleIndex]
+        patterns = sorted(pattern for pattern, patternNumber in self.patternNumbers.items() if patternCounts[:, patternNumber].sum() > 0)
+
+        return [listOfAttributes, np.array(patterns).reshape(-1, 2), patternCounts[:, [self.patternNumbers[pattern] for pattern in patterns]]]
+
+#   the digest function gives a short hash of any picklable value, used to tell whether a paper's annotations have changed
+
+def digest(value):
+
+    return hashlib.sha256(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)).hexdigest()
@@ -0,0 +1,157 @@
+########################################################################################################################
+#   Timing and memory measurements of the stages of a job, written as one JSON object per line so a slow run can be
+#   traced to the stage that is slow
+########################################################################################################################
+
+
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+#   the currentRss function gives the resident set size of this process in bytes, or None where /proc is not available
+
+def currentRss():
+
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+#   the maximumRss function gives the peak resident set size of this process in bytes, or None where the resource module is not available.
+#   ru_maxrss is in kilobytes on Linux and in bytes on macOS
+
+def maximumRss():
+
+    if resource is None:
+        return None
+
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+#   the StageSpan class measures one stage between entering and leaving a with block, and writes it to its recorder when it ends. Counts of
+#   what the stage handled, such as rows or units, are given when the span is made or added with count inside the block
+
+class StageSpan:
+
+    def __init__(self, recorder, name, counts):
+
+        self.recorder = recorder
+        self.name = name
+        self.counts = counts
+
+    def count(self, **counts):
+
+        self.counts.update(counts)
+
+    def __enter__(self):
+
+        if self.recorder.traceMemory:
+            tracemalloc.reset_peak()
+            self.startTraced = tracemalloc.get_traced_memory()[0]
+
+        self.startRss = currentRss()
+        self.startTime = time.perf_counter()
+
+        return self
+
+    def __exit__(self, exceptionType, exceptionValue, traceback):
+
+        endTime = time.perf_counter()
+
+        record = {'stage': self.name, 'seconds': endTime - self.startTime, 'startSeconds': self.startTime - self.recorder.startTime}
+
+        endRss = currentRss()
+
+        if endRss is not None:
+            record['rssBytes'] = endRss
+            record['rssDeltaBytes'] = endRss - self.startRss
+
+        record['maxRssBytes'] = maximumRss()
+
+        if self.recorder.traceMemory:
+            tracedCurrent, tracedPeak = tracemalloc.get_traced_memory()
+            record['tracedDeltaBytes'] = tracedCurrent - self.startTraced
+            record['tracedPeakBytes'] = tracedPeak - self.startTraced
+
+        if exceptionType is not None:
+            record['error'] = exceptionType.__name__
+
+        record.update(self.counts)
+
+        self.recorder.write(record)
+
+        return False
+
+#   the StageRecorder class writes a StageSpan for every stage of a job to reportFileName as JSON lines, and a last 'total' line when it is
+#   closed. With traceMemory the memory Python allocates is followed with tracemalloc as well as the resident set size, which is more
+#   precise but slows the job down. Spans are not nested, as each one resets the tracemalloc peak
+
+class StageRecorder:
+
+    def __init__(self, reportFileName, traceMemory=False):
+
+        self.reportFile = open(reportFileName, 'w')
+        self.traceMemory = traceMemory
+        self.startTime = time.perf_counter()
+
+        if traceMemory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.startedTracing = True
+        else:
+            self.startedTracing = False
+
+    def stage(self, name, **counts):
+
+        return StageSpan(self, name, counts)
+
+    def write(self, record):
+
+        self.reportFile.write(json.dumps(record) + '\n')
+
+    def close(self):
+
+        self.write({'stage': 'total', 'seconds': time.perf_counter() - self.startTime, 'maxRssBytes': maximumRss()})
+        self.reportFile.close()
+
+        if self.startedTracing:
+            tracemalloc.stop()
+
+#   the NoStageRecorder class is used when no report is wanted. Its stage gives one shared span that does nothing, so the stages of a job
+#   cost a method call each
+
+class NoStageSpan:
+
+    def count(self, **counts):
+
+        pass
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, exceptionType, exceptionValue, traceback):
+
+        return False
+
+class NoStageRecorder:
+
+    span = NoStageSpan()
+
+    def stage(self, name, **counts):
+
+        return self.span
+
+    def close(self):
+
+        pass
+
+noStageRecorder = NoStageRecorder()
@@ -0,0 +1,122 @@
+########################################################################################################################
+#   Levels of measurement other than nominal: reading the level of each attribute, taking a typed value, such as a sample
+#   size or a rating, from each coder's annotated text, and the alpha values of those attributes at their level
+########################################################################################################################
+
+
+import csv
+import re
+import numpy as np
+from array import array
+
+from .reliability import levelsOfMeasurement, typedAlphaValues
+from .textagreement import TextAgreement
+
+#   the readAttributeLevels function reads a csv file with a row for each attribute that is not nominal, giving the AttributeId or the
+#   attribute title and then the level of measurement, and returns a dictionary from the AttributeId or title to the level. A first row
+#   of 'attribute,level' is taken as a header
+
+def readAttributeLevels(levelsFileName):
+
+    attributeLevels = {}
+
+    with open(levelsFileName, newline='', encoding='utf8') as f:
+
+        for lineNumber, row in enumerate(csv.reader(f), 1):
+
+            if not row or (lineNumber == 1 and [cell.strip().lower() for cell in row] == ['attribute', 'level']):
+                continue
+
+            if len(row) != 2 or row[1].strip().lower() not in levelsOfMeasurement:
+                raise ValueError(levelsFileName + ' line ' + str(lineNumber) + ': expected an attribute and one of ' + ', '.join(levelsOfMeasurement))
+
+            attribute = row[0].strip()
+            attributeLevels[int(attribute) if attribute.isdigit() else attribute] = row[1].strip().lower()
+
+    return attributeLevels
+
+#   the typedValue function gives the first number in a text cell produced by sortCodes, or np.nan when the coder annotated nothing or the
+#   text has no number. Commas between groups of three digits are taken as thousands separators, as in 1,200 participants
+
+numberPattern = re.compile(r'[-+]?(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?')
+
+def typedValue(cellText):
+
+    if cellText in TextAgreement.untextedCells:
+        return np.nan
+
+    spanTexts = cellText.split(';')[:-1] if cellText.endswith(';') else [cellText]
+
+    for spanText in spanTexts:
+
+        number = numberPattern.search(TextAgreement.spanPrefix.sub('', spanText))
+
+        if number is not None:
+            return float(number.group().replace(',', ''))
+
+    return np.nan
+
+#   the TypedValues class collects the typed values of the attributes given a level other than nominal in attributeLevels, keyed by
+#   AttributeId or title, from the text rows as mergeCoderRows consumes them. A level given for the AttributeId is used before one given
+#   for the title. The text of each distinct cell is only searched once. The AttributeIds and titles that matched a row are kept, so the
+#   entries of attributeLevels that matched none, usually a mistyped title, can be reported by unusedLevels
+
+class TypedValues:
+
+    def __init__(self, attributeLevels, numberOfCoders):
+
+        self.attributeLevels = attributeLevels
+        self.numberOfCoders = numberOfCoders
+        self.levelByTitle = {}
+        self.attributeIndexByTitle = {}
+        self.attributeColumn = array('l')
+        self.coderValues = [array('d') for coder in range(numberOfCoders)]
+        self.valueCache = {}
+        self.usedLevels = set()
+
+    def addRow(self, binaryRow, textRow):
+
+        if binaryRow[2] in self.attributeLevels:
+            levelKey = binaryRow[2]
+        elif binaryRow[3] in self.attributeLevels:
+            levelKey = binaryRow[3]
+        else:
+            return
+
+        self.usedLevels.add(levelKey)
+        level = self.attributeLevels[levelKey]
+
+        if level == 'nominal':
+            return
+
+        self.levelByTitle.setdefault(binaryRow[3], level)
+        self.attributeColumn.append(self.attributeIndexByTitle.setdefault(binaryRow[3], len(self.attributeIndexByTitle)))
+
+        for coder in range(self.numberOfCoders):
+
+            cellText = textRow[5 + coder]
+
+            if cellText not in self.valueCache:
+                self.valueCache[cellText] = typedValue(cellText)
+
+            self.coderValues[coder].append(self.valueCache[cellText])
+
+    #   unusedLevels gives the AttributeIds and titles of attributeLevels that did not match any row, in the order they were given
+
+    def unusedLevels(self):
+
+        return [levelKey for levelKey in self.attributeLevels if levelKey not in self.usedLevels]
+
+    #   alphaValues gives the alpha value of every typed attribute by title, using only the coders in coderSubset when it is given
+
+    def alphaValues(self, coderSubset=None):
+
+        typedData = np.array([np.frombuffer(values, dtype=np.float64) for values in self.coderValues]).reshape(self.numberOfCoders, -1)
+
+        if coderSubset is not None:
+            typedData = typedData[list(coderSubset)]
+
+        alphas = typedAlphaValues([self.levelByTitle[title] for title in self.attributeIndexByTitle],
+                                  np.array(self.attributeColumn, dtype=np.intp), typedData)
+
+        return {title: float(alphas[i]) for title, i in self.attributeIndexByTitle.items()}
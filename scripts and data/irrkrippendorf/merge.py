@@ -0,0 +1,272 @@
+########################################################################################################################
+#   Merging the annotations of each group of coders into one binary and one text row per paper, attribute and arm
+########################################################################################################################
+
+
+import csv
+import os
+import numpy as np
+from array import array
+from collections import namedtuple
+from contextlib import contextmanager
+
+from .codesets import checkCodesetGroup, getCodeSet, getPapersFromCoderGroup
+from .exports import loadReviewExports, statusNothingCoded, statusTickedNoValue
+
+# the sortCodes function converts the annotation of one coder for a paper, attribute and arm, given as a status and the list of annotated
+# texts, into a binary value, "1" if anything was coded and "0" otherwise, and the cleaned text written to the text spreadsheet
+
+def sortCodes(status, individualCode=None):
+
+    if status == statusNothingCoded:
+
+        outputCode = "0"
+        textOutputCode = "nothing coded"
+
+    elif status == statusTickedNoValue:
+
+        outputCode = "1"
+        textOutputCode = "code ticked with no value"
+
+    elif len(individualCode) == 1:
+
+        outputCode = "1"
+        textOutputCode = ((((individualCode[0].replace('\n',"")).lstrip('Page')).replace("[¬e]","")).replace("[¬s]",""))[3:]
+
+    else:
+
+        outputCode = "1"
+        textOutputCode = ""
+        for item in individualCode:
+            textOutputCode = textOutputCode + ((((item.replace('\n', "")).lstrip('Page')).replace("[¬e]", "")).replace("[¬s", ""))[3:] + ";"
+
+    return([outputCode, textOutputCode])
+
+# the TextRow class is a text row that also carries the offsets of each coder's annotated texts, as spanOffsets: for each coder a tuple of
+# the (ItemDocumentId, TextFrom, TextTo) of every text in the cell, or None when the coder annotated no text. It is written to the
+# spreadsheets as the plain row, and TextAgreement uses the offsets to measure character overlap
+
+class TextRow(tuple):
+
+    def __new__(cls, cells, spanOffsets=None):
+
+        textRow = tuple.__new__(cls, cells)
+        textRow.spanOffsets = spanOffsets
+
+        return textRow
+
+# the produceCsv function takes the parsed exports of every coder for one codeset as input, uses the annotations extracted from them, and
+# yields a pair of csv rows (binary and text) summarising each coders annotations for each paper, arm and attribute. The rows hold one
+# column per coder, in the order the exports are given. The papers are those of any coder, and a coder whose export lacks a paper is
+# taken to have coded nothing for it. When selectedPapers is given only the rows of those paper IDs are produced
+
+def produceCsv(coderExports, selectedPapers=None):
+
+    codesForSet = getCodeSet(coderExports[0])
+
+    papersAndNames = getPapersFromCoderGroup(coderExports)
+
+    numberOfCoders = len(coderExports)
+
+    #   presuming the codesets are the same, the attributes are taken from the codeset obtained from the first coder's json file.
+    #   If the codesets are not identical this will cause errors or issues with the output data
+
+    #   the rows of an attribute that no coder coded for a paper are the same apart from the paper, so the rest of each of those rows is
+    #   made once here, and the positions of every attribute ID in the codeset are kept to find the coded attributes of a paper
+
+    zeroBinaryTails = [(attribute[0], attribute[1], "Whole Study") + ('0',) * numberOfCoders for attribute in codesForSet[1]]
+    zeroTextTails = [(attribute[0], attribute[1], "Whole Study") + ('nothing coded',) * numberOfCoders for attribute in codesForSet[1]]
+
+    attributePositions = {}
+
+    for position, attribute in enumerate(codesForSet[1]):
+        attributePositions.setdefault(attribute[0], []).append(position)
+
+    #   the cleaned text of an annotation is the same wherever it appears, so each distinct list of annotated texts is only cleaned once,
+    #   and the two statuses without text always give the same codes
+
+    fixedCodes = {statusNothingCoded: sortCodes(statusNothingCoded), statusTickedNoValue: sortCodes(statusTickedNoValue)}
+    textCodes = {}
+
+    def sortedCode(status, texts):
+
+        if status in fixedCodes:
+            return fixedCodes[status]
+
+        textKey = tuple(texts)
+
+        if textKey not in textCodes:
+            textCodes[textKey] = sortCodes(status, texts)
+
+        return textCodes[textKey]
+
+    def zeroRows(paperKey, start, end):
+
+        return ((paperKey + binaryTail, paperKey + textTail) for binaryTail, textTail in zip(zeroBinaryTails[start:end], zeroTextTails[start:end]))
+
+    #   the below yields the rows of the desired csv table format, converting text values into 0's or 1's depending on whether any text
+    #   was annotated. The coded cells of every coder are looked up for one paper at a time, and the rows of the attributes between the
+    #   coded ones are all zeros, yielded in runs. For a coded attribute the arms are taken in the order the coders are given, and a coder
+    #   who did not code an arm is given "nothing coded"
+
+    for paper in papersAndNames:
+
+        if selectedPapers is not None and paper[0] not in selectedPapers:
+            continue
+
+        paperKey = (paper[0], paper[1])
+
+        coderCells = [coderExport.annotations.attributeCells(paper[0]) if paper[0] in coderExport.annotations.paperCells else {}
+                      for coderExport in coderExports]
+
+        codedPositions = sorted(position for attributeId in set().union(*coderCells) for position in attributePositions.get(attributeId, ()))
+
+        previousPosition = 0
+
+        for position in codedPositions:
+
+            yield from zeroRows(paperKey, previousPosition, position)
+            previousPosition = position + 1
+
+            attribute = codesForSet[1][position]
+            codingCoders = [attributeCells.get(attribute[0]) for attributeCells in coderCells]
+
+            armCodes = {}
+
+            for coder in range(numberOfCoders):
+
+                for arm, status, texts, offsets in codingCoders[coder] or []:
+
+                    if arm not in armCodes:
+                        armCodes[arm] = [[statusNothingCoded, None, None]] * numberOfCoders
+
+                    if armCodes[arm][coder][0] == statusNothingCoded:
+                        armCodes[arm][coder] = [status, texts, offsets]
+
+            for arm, codes in armCodes.items():
+
+                if arm == '':
+
+                    armName = "Whole Study"
+
+                else:
+
+                    armName = arm
+
+                sortedCodes = [sortedCode(status, texts) for status, texts, offsets in codes]
+
+                yield (paperKey + (attribute[0], attribute[1], armName) + tuple(sortedCode[0] for sortedCode in sortedCodes),
+                       TextRow(paperKey + (attribute[0], attribute[1], armName) + tuple(sortedCode[1] for sortedCode in sortedCodes),
+                               tuple(offsets for status, texts, offsets in codes)))
+
+        yield from zeroRows(paperKey, previousPosition, len(codesForSet[1]))
+
+# the spreadsheetHeader function gives the header row of the binary and text spreadsheets, with a column for each coder
+
+def spreadsheetHeader(numberOfCoders):
+
+    return ['paperID', 'shortTitle', 'AttributeId', 'AttributeTitle', 'ArmTitle'] + ['Coder' + str(coder + 1) + 'Text' for coder in range(numberOfCoders)]
+
+# the processCoderGroup function does all the work for one group of JSON files, usually in a worker process: it parses the exports, checks
+# their codesets and merges their annotations. It returns the group's CodesetComparisons, comparison text, rows and the first coder's
+# codesets, so the main process can write them in the same order as a serial run. When an ExportCache is given the whole result is
+# cached for the group's file contents
+
+def processCoderGroup(coderFiles, cache=None):
+
+    if cache is not None:
+
+        groupResult = cache.load(cache.groupKey(coderFiles))
+
+        if groupResult is not None:
+            return groupResult
+
+    reviewExports = loadReviewExports(coderFiles, cache)
+    coderExports = [reviewExports[coderFile] for coderFile in coderFiles]
+
+    comparisons, groupText = checkCodesetGroup(coderExports)
+
+    groupResult = [comparisons, groupText, list(produceCsv(coderExports)), coderExports[0].codeSets]
+
+    if cache is not None:
+        cache.store(cache.groupKey(coderFiles), groupResult)
+
+    return groupResult
+
+# the mergeCoderRows function takes the rows produced for each group of JSON files and returns what the reliability stage needs: the list
+# of attribute titles in order of first appearance, a NumPy column giving the index of each row's attribute in that list, a coders x
+# rows NumPy matrix of binary values and the RowKeys of each row. Rows are passed to the optional csv writers, TextAgreement,
+# ColumnarWriter and TypedValues as they are consumed so the spreadsheets never need to be read back in
+
+RowKeys = namedtuple('RowKeys', ['groupNumber', 'attributeId', 'unit'])
+
+def mergeCoderRows(groupRows, numberOfCoders, binaryWriter=None, textWriter=None, textAgreement=None, columnarWriter=None,
+                   typedValues=None):
+
+    attributeIndexByTitle = {}
+    attributeColumn = []
+    coderInclusive = [[] for coder in range(numberOfCoders)]
+
+    #   a unit is one arm of one paper in one group; the rows of different attributes for the same unit share its number
+
+    unitNumbers = {}
+    groupColumn = array('l')
+    attributeIdColumn = array('q')
+    unitColumn = array('l')
+
+    for groupNumber, rows in enumerate(groupRows):
+
+        for binaryRow, textRow in rows:
+
+            attributeColumn.append(attributeIndexByTitle.setdefault(binaryRow[3], len(attributeIndexByTitle)))
+
+            groupColumn.append(groupNumber)
+            attributeIdColumn.append(binaryRow[2])
+            unitColumn.append(unitNumbers.setdefault((groupNumber, binaryRow[0], binaryRow[4]), len(unitNumbers)))
+
+            for coder in range(numberOfCoders):
+                coderInclusive[coder].append(int(binaryRow[5 + coder]))
+
+            if binaryWriter is not None:
+                binaryWriter.writerow(binaryRow)
+                textWriter.writerow(textRow)
+
+            if textAgreement is not None:
+                textAgreement.addRow(textRow)
+
+            if columnarWriter is not None:
+                columnarWriter.writerow(binaryRow, textRow)
+
+            if typedValues is not None:
+                typedValues.addRow(binaryRow, textRow)
+
+    listOfAttributes = list(attributeIndexByTitle)
+    attributeIndex = np.array(attributeColumn, dtype=np.intp)
+    reliabilityData = np.array(coderInclusive, dtype=np.float64)
+    rowKeys = RowKeys(np.array(groupColumn, dtype=np.intp), np.array(attributeIdColumn, dtype=np.int64), np.array(unitColumn, dtype=np.intp))
+
+    return [listOfAttributes, attributeIndex, reliabilityData, rowKeys]
+
+# the spreadsheetWriters function opens the binary and text spreadsheets in outputDirectory and gives a csv writer for each with the header
+# already written, or a pair of None when outputDirectory is None
+
+binarySpreadsheetFileName = 'IrrSpreadsheetBinary.csv'
+textSpreadsheetFileName = 'IrrSpreadsheetText.csv'
+
+@contextmanager
+def spreadsheetWriters(numberOfCoders, outputDirectory):
+
+    if outputDirectory is None:
+        yield None, None
+        return
+
+    with open(os.path.join(outputDirectory, binarySpreadsheetFileName), 'w', newline='', encoding="utf8") as binaryFile, \
+            open(os.path.join(outputDirectory, textSpreadsheetFileName), 'w', newline='', encoding="utf8") as textFile:
+
+        binaryWriter = csv.writer(binaryFile, lineterminator='\n')
+        textWriter = csv.writer(textFile, lineterminator='\n')
+
+        binaryWriter.writerow(spreadsheetHeader(numberOfCoders))
+        textWriter.writerow(spreadsheetHeader(numberOfCoders))
+
+        yield binaryWriter, textWriter
@@ -0,0 +1,332 @@
+########################################################################################################################
+#   Krippendorff's alpha of the merged values: coincidence matrices, per attribute at any level of measurement, per pair of
+#   coders, over the codeset trees and with bootstrap confidence intervals
+########################################################################################################################
+
+
+import warnings
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+
+#   the coincidenceCountsByGroup function builds the Krippendorff coincidence matrix of every group of units in one batched pass.
+#   reliabilityData is a coders x units matrix (missing values are np.nan), groupIndex gives the group of each unit and the result has
+#   shape groups x values x values. Each unit contributes its pairable value counts divided by (pairable coders - 1), as in the
+#   krippendorff package. The whole-number pair counts are summed per group with np.bincount for each number of pairable coders and
+#   divided once, so the totals do not depend on the order the units are summed in. With pairCounts the sums are not divided at all
+
+def coincidenceCountsByGroup(reliabilityData, groupIndex, numberOfGroups, valueDomain=(0, 1), pairCounts=False):
+
+    valueDomain = np.asarray(valueDomain)
+    valueCounts = (reliabilityData.T[:, :, np.newaxis] == valueDomain[np.newaxis, np.newaxis, :]).sum(axis=1)
+    pairable = np.maximum(valueCounts.sum(axis=1), 2)
+
+    if pairCounts:
+        pairableGroups = [(1, slice(None))]
+    else:
+        pairableGroups = [(pairableCoders - 1, pairable == pairableCoders) for pairableCoders in np.unique(pairable)]
+
+    coincidences = np.zeros((numberOfGroups, len(valueDomain), len(valueDomain)))
+
+    for c in range(len(valueDomain)):
+        for k in range(len(valueDomain)):
+
+            unitCoincidences = valueCounts[:, c] * valueCounts[:, k]
+
+            if c == k:
+                unitCoincidences = unitCoincidences - valueCounts[:, c]
+
+            for divisor, units in pairableGroups:
+                coincidences[:, c, k] += np.bincount(groupIndex[units], weights=unitCoincidences[units], minlength=numberOfGroups) / divisor
+
+    return coincidences
+
+#   the pairCoincidencesByGroup function builds the coincidence matrices of any value domain. valueIndices is a coders x units matrix of
+#   the index of each value in the domain, -1 where it is missing. Every ordered pair of coders who both gave a value to a unit adds
+#   1 / (pairable coders - 1) to the coincidence of their two values, so the work grows with the number of coders and units but not
+#   with the size of the domain
+
+def pairCoincidencesByGroup(valueIndices, groupIndex, numberOfGroups, numberOfValues):
+
+    present = valueIndices >= 0
+    pairable = present.sum(axis=0)
+    weights = 1 / np.maximum(pairable - 1, 1)
+
+    cellIndex = []
+    cellWeights = []
+
+    for coder1 in range(valueIndices.shape[0]):
+        for coder2 in range(valueIndices.shape[0]):
+
+            if coder1 != coder2:
+
+                both = present[coder1] & present[coder2]
+
+                cellIndex.append((groupIndex[both] * numberOfValues + valueIndices[coder1, both]) * numberOfValues + valueIndices[coder2, both])
+                cellWeights.append(weights[both])
+
+    cellIndex = np.concatenate(cellIndex) if cellIndex else np.zeros(0, dtype=np.intp)
+    cellWeights = np.concatenate(cellWeights) if cellWeights else np.zeros(0)
+
+    return np.bincount(cellIndex, weights=cellWeights, minlength=numberOfGroups * numberOfValues * numberOfValues) \
+        .reshape(numberOfGroups, numberOfValues, numberOfValues)
+
+#   the differenceMatrix function gives the squared difference between every two values of a sorted value domain for a level of
+#   measurement, as defined by Krippendorff. The ordinal differences depend on how often each value was used, so for the ordinal level
+#   valueTotals gives the value totals of each group (groups x values) and the result is one matrix per group
+
+levelsOfMeasurement = ['nominal', 'ordinal', 'interval', 'ratio']
+
+def differenceMatrix(valueDomain, level, valueTotals=None):
+
+    valueDomain = np.asarray(valueDomain, dtype=np.float64)
+
+    if level == 'nominal':
+        return 1 - np.eye(len(valueDomain))
+
+    if level == 'interval':
+        return (valueDomain[:, np.newaxis] - valueDomain[np.newaxis, :]) ** 2
+
+    if level == 'ratio':
+        with np.errstate(divide='ignore', invalid='ignore'):
+            differences = ((valueDomain[:, np.newaxis] - valueDomain[np.newaxis, :]) / (valueDomain[:, np.newaxis] + valueDomain[np.newaxis, :])) ** 2
+        return np.nan_to_num(differences)
+
+    if level == 'ordinal':
+        midpoints = np.cumsum(valueTotals, axis=-1) - valueTotals / 2
+        return (midpoints[..., :, np.newaxis] - midpoints[..., np.newaxis, :]) ** 2
+
+    raise ValueError('unknown level of measurement ' + repr(level) + ', expected one of ' + ', '.join(levelsOfMeasurement))
+
+#   the alphaFromCoincidences function computes alpha for any stack of coincidence matrices (shape ... x values x values) at once, with
+#   differences either one matrix for the whole stack or one per coincidence matrix. Groups where the expected disagreement is zero, for
+#   example when only one value was ever used, give np.nan
+
+def alphaFromCoincidences(coincidences, differences):
+
+    numberOfValues = coincidences.shape[-1]
+    valueTotals = coincidences.sum(axis=-1)
+    total = valueTotals.sum(axis=-1)
+
+    expected = (valueTotals[..., :, np.newaxis] * valueTotals[..., np.newaxis, :] - valueTotals[..., :, np.newaxis] * np.eye(numberOfValues)) \
+        / (total - 1)[..., np.newaxis, np.newaxis]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 1 - (coincidences * differences).sum(axis=(-2, -1)) / (expected * differences).sum(axis=(-2, -1))
+
+#   the nominalAlphaFromCoincidences function computes nominal alpha for any stack of coincidence matrices, as alphaFromCoincidences
+
+def nominalAlphaFromCoincidences(coincidences):
+
+    return alphaFromCoincidences(coincidences, differenceMatrix(range(coincidences.shape[-1]), 'nominal'))
+
+#   the typedAlphaValues function computes the alpha value of every attribute of typed values, the numbers taken from the annotated text,
+#   at its own level of measurement. typedData is a coders x rows matrix (np.nan where missing), attributeIndex gives the attribute of
+#   each row and attributeLevels the level of each attribute. Attributes with the same level and the same value domain, such as ratings
+#   from 1 to 5, are computed together with one difference matrix. It returns an array of alpha values, np.nan for an attribute with
+#   fewer than two values
+
+def typedAlphaValues(attributeLevels, attributeIndex, typedData):
+
+    if len(attributeLevels) == 0:
+        return np.full(0, np.nan)
+
+    alphas = np.full(len(attributeLevels), np.nan)
+    batches = {}
+
+    #   the rows are sorted by attribute once and split into the rows of each attribute, in their original order
+
+    rowsByAttribute = np.split(np.argsort(attributeIndex, kind='stable'), np.cumsum(np.bincount(attributeIndex, minlength=len(attributeLevels)))[:-1])
+
+    for attribute, attributeRows in enumerate(rowsByAttribute):
+
+        valueDomain = np.unique(typedData[:, attributeRows][~np.isnan(typedData[:, attributeRows])])
+
+        batches.setdefault((attributeLevels[attribute], tuple(valueDomain.tolist())), []).append([attribute, attributeRows])
+
+    for (level, valueDomain), batch in batches.items():
+
+        if len(valueDomain) == 0:
+            continue
+
+        rows = np.concatenate([attributeRows for attribute, attributeRows in batch])
+        groupIndex = np.repeat(np.arange(len(batch)), [len(attributeRows) for attribute, attributeRows in batch])
+
+        batchData = typedData[:, rows]
+        valueIndices = np.where(np.isnan(batchData), -1, np.searchsorted(valueDomain, np.nan_to_num(batchData)))
+
+        coincidences = pairCoincidencesByGroup(valueIndices, groupIndex, len(batch), len(valueDomain))
+
+        alphas[[attribute for attribute, attributeRows in batch]] = alphaFromCoincidences(coincidences, differenceMatrix(valueDomain, level, coincidences.sum(axis=-1)))
+
+    return alphas
+
+#   the attributeAlphaValues function gives the alpha value of every attribute that has been annotated at least once, followed by the
+#   overall values including all attributes ('All Entities') and only the attributes with at least one annotation ('Entities with data').
+#   The overall values are computed from the summed per-attribute coincidence matrices rather than from a rebuilt table
+
+def attributeAlphaValues(listOfAttributes, attributeIndex, reliabilityData):
+
+    hasData = np.bincount(attributeIndex, weights=(reliabilityData == 1).any(axis=0), minlength=len(listOfAttributes)) > 0
+
+    coincidences = coincidenceCountsByGroup(reliabilityData, attributeIndex, len(listOfAttributes))
+
+    return alphaValuesFromCoincidences(listOfAttributes, coincidences, hasData)
+
+#   the alphaValuesFromCoincidences function gives the same dictionary as attributeAlphaValues from per-attribute coincidence matrices that
+#   have already been counted, with hasData marking the attributes annotated at least once
+
+def alphaValuesFromCoincidences(listOfAttributes, coincidences, hasData):
+
+    attributeAlphas = nominalAlphaFromCoincidences(coincidences)
+
+    alphaValues = {}
+
+    for i in np.flatnonzero(hasData):
+        alphaValues[listOfAttributes[i]] = float(attributeAlphas[i])
+
+    alphaValues['All Entities'] = float(nominalAlphaFromCoincidences(coincidences.sum(axis=0)))
+    alphaValues['Entities with data'] = float(nominalAlphaFromCoincidences(coincidences[hasData].sum(axis=0)))
+
+    return alphaValues
+
+#   the pairwiseAlphaValues function computes attributeAlphaValues for every pair of coders from the same merged coders x rows matrix.
+#   It returns the pairs as (coder, coder) index tuples and, for each key of alphaValues, the list of pairwise values in that order.
+#   An attribute that neither coder of a pair annotated has no value for that pair and is given np.nan
+
+def pairwiseAlphaValues(listOfAttributes, attributeIndex, reliabilityData, alphaValues):
+
+    coderPairs = list(combinations(range(reliabilityData.shape[0]), 2))
+
+    pairAlphaValues = [attributeAlphaValues(listOfAttributes, attributeIndex, reliabilityData[list(coderPair)]) for coderPair in coderPairs]
+
+    return [coderPairs, pairwiseTable(alphaValues, pairAlphaValues)]
+
+#   the pairwiseTable function lines up the alpha values of each pair of coders with the keys of alphaValues
+
+def pairwiseTable(alphaValues, pairAlphaValues):
+
+    pairwiseValues = {key: [] for key in alphaValues}
+
+    for pairValues in pairAlphaValues:
+
+        for key in pairwiseValues:
+            pairwiseValues[key].append(pairValues.get(key, float('nan')))
+
+    return pairwiseValues
+
+#   the hierarchyAlphaValues function gives the alpha value over all coders of every node of a CodesetTree, where a node counts as coded
+#   for a unit (one arm of one paper in one group) when the node or any of its descendants is. Each row is paired with its node and all
+#   of the node's ancestors, the coder values of each (node, unit) pair are combined with a maximum, which is a logical or of the binary
+#   values, and the coincidences of every node come from one bincount over the combined values. It returns a list of alpha values in the
+#   preorder of the tree, NaN for a node with no units
+
+def hierarchyAlphaValues(tree, codeSetIds, rowKeys, reliabilityData):
+
+    rowNodes = np.array([tree.nodeNumbers.get((codeSetIds[groupNumber], attributeId), -1)
+                         for groupNumber, attributeId in zip(rowKeys.groupNumber.tolist(), rowKeys.attributeId.tolist())], dtype=np.intp)
+
+    #   rows whose attribute is not in the tree, which happens when the coders' codesets differ, are left out
+
+    inTree = rowNodes >= 0
+    ancestors = tree.ancestorTable()[rowNodes[inTree]]
+    units = np.broadcast_to(rowKeys.unit[inTree][:, np.newaxis], ancestors.shape)
+    isNode = ancestors >= 0
+
+    numberOfUnits = int(rowKeys.unit.max()) + 1 if len(rowKeys.unit) else 0
+    pairKeys, pairIndex = np.unique(ancestors[isNode] * numberOfUnits + units[isNode], return_inverse=True)
+
+    pairValues = np.full((reliabilityData.shape[0], len(pairKeys)), np.nan)
+
+    for coder in range(reliabilityData.shape[0]):
+        coderValues = np.broadcast_to(reliabilityData[coder, inTree][:, np.newaxis], ancestors.shape)[isNode]
+        np.fmax.at(pairValues[coder], pairIndex.reshape(-1), coderValues)
+
+    coincidences = coincidenceCountsByGroup(pairValues, pairKeys // max(numberOfUnits, 1), len(tree.attributeIds))
+
+    return nominalAlphaFromCoincidences(coincidences).tolist()
+
+#   the valueCountPatterns function reduces a coders x units matrix to the distinct patterns of value counts its units show (with binary
+#   data and two coders there are only three: both 0, one of each, both 1) and counts how many units of each group show each pattern.
+#   These counts are all a unit-resampling bootstrap needs, since a resampled group's coincidences are the sum of its patterns'
+
+def valueCountPatterns(reliabilityData, groupIndex, numberOfGroups, valueDomain=(0, 1)):
+
+    valueDomain = np.asarray(valueDomain)
+    valueCounts = (reliabilityData.T[:, :, np.newaxis] == valueDomain[np.newaxis, np.newaxis, :]).sum(axis=1)
+
+    patterns, patternNumber = np.unique(valueCounts.reshape(-1, len(valueDomain)), axis=0, return_inverse=True)
+
+    patternCounts = np.zeros((numberOfGroups, len(patterns)))
+    np.add.at(patternCounts, (groupIndex, patternNumber.reshape(-1)), 1)
+
+    return [patterns, patternCounts]
+
+#   the patternCoincidences function gives the coincidences one unit of each value-count pattern contributes, as in coincidenceCountsByGroup
+
+def patternCoincidences(patterns):
+
+    pairable = np.maximum(patterns.sum(axis=1), 2)
+    unitCoincidences = patterns[:, :, np.newaxis] * patterns[:, np.newaxis, :] - patterns[:, :, np.newaxis] * np.eye(patterns.shape[1])
+
+    return unitCoincidences / (pairable - 1)[:, np.newaxis, np.newaxis]
+
+#   the bootstrapBlock function computes one block of bootstrap replicates for every group at once. Each replicate resamples each group's
+#   units with replacement, which is a multinomial draw over its value-count patterns, and the replicate coincidences are the drawn counts
+#   times the pattern coincidences. It returns a replicates x groups array of nominal alpha values
+
+def bootstrapBlock(patterns, patternCounts, replicates, seedSequence):
+
+    rng = np.random.default_rng(seedSequence)
+
+    units = patternCounts.sum(axis=1)
+    probabilities = np.divide(patternCounts, units[:, np.newaxis], out=np.full(patternCounts.shape, 1 / patternCounts.shape[1]), where=units[:, np.newaxis] > 0)
+
+    draws = rng.multinomial(units.astype(np.int64), probabilities, size=(replicates, len(units)))
+
+    coincidences = np.tensordot(draws, patternCoincidences(patterns), axes=([2], [0]))
+
+    return nominalAlphaFromCoincidences(coincidences)
+
+#   the bootstrapIntervals function gives a percentile confidence interval for each key of alphaValues: every attribute with data and the
+#   'All Entities' and 'Entities with data' rows, whose units are those of all attributes and of the attributes with data. The replicates
+#   are split into blocks with their own seeds spawned from seed, so the intervals are the same whether the blocks run in this process or
+#   across a pool of workers. When there are no units at all the intervals are np.nan. confidenceLevel is a fraction, such as 0.95
+
+bootstrapBlockSize = 250
+
+def bootstrapIntervals(listOfAttributes, patterns, patternCounts, alphaValues, replicates, confidenceLevel=0.95, seed=None, workers=1):
+
+    if not 0 < confidenceLevel < 1:
+        raise ValueError('the confidence level must be between 0 and 1, such as 0.95, not ' + str(confidenceLevel))
+
+    if replicates < 0:
+        raise ValueError('the number of bootstrap replicates must not be negative, not ' + str(replicates))
+
+    keys = [title for title in listOfAttributes if title in alphaValues] + ['All Entities', 'Entities with data']
+
+    #   with no units there is nothing to resample, as when every export has an empty References list
+
+    if len(patterns) == 0:
+        return {key: [np.nan, np.nan] for key in keys}
+
+    hasData = np.array([title in alphaValues for title in listOfAttributes], dtype=bool)
+
+    groupCounts = np.concatenate([patternCounts[hasData], patternCounts.sum(axis=0, keepdims=True), patternCounts[hasData].sum(axis=0, keepdims=True)])
+
+    blockSizes = [bootstrapBlockSize] * (replicates // bootstrapBlockSize) + ([replicates % bootstrapBlockSize] if replicates % bootstrapBlockSize else [])
+    seedSequences = np.random.SeedSequence(seed).spawn(len(blockSizes))
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            blocks = list(executor.map(bootstrapBlock, [patterns] * len(blockSizes), [groupCounts] * len(blockSizes), blockSizes, seedSequences))
+    else:
+        blocks = [bootstrapBlock(patterns, groupCounts, blockSize, seedSequence) for blockSize, seedSequence in zip(blockSizes, seedSequences)]
+
+    replicateAlphas = np.concatenate(blocks)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        lower, upper = np.nanpercentile(replicateAlphas, [50 * (1 - confidenceLevel), 50 * (1 + confidenceLevel)], axis=0)
+
+    return {key: [float(lower[i]), float(upper[i])] for i, key in enumerate(keys)}
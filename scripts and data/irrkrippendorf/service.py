@@ -0,0 +1,317 @@
+########################################################################################################################
+#   A long-running service that runs many inter-rater reliability jobs, so parsed exports and codesets are kept between
+#   jobs instead of every job being a fresh run of the script. Jobs are JSON lines read from stdin or from a local TCP
+#   port, and a JSON line is written back for each job as it is queued and as it finishes. Run it with
+#   python -m irrkrippendorf.service
+########################################################################################################################
+
+
+import argparse
+import asyncio
+import functools
+import json
+import math
+import os
+import re
+import stat
+import sys
+import time
+from collections import OrderedDict
+from contextlib import AsyncExitStack
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from .api import loadExport, resultsFileName, runJob
+from .exports import ExportCache
+from .levels import readAttributeLevels
+
+#   the IrrService class runs the jobs given to submit from a queue, at most concurrentJobs at a time. The JSON files of a job are parsed in
+#   a pool of worker processes, off the event loop, and the parsed exports are kept for the next jobs, up to maximumExports of them,
+#   until a file's size or modification time changes. A file that several queued jobs need is only parsed once. Exports with the same
+#   codeset SetId and the same codeset share one copy of it. The jobs themselves run in threads, on the exports already loaded. A job
+#   with no outputDir writes to a directory of its own named after its id, and jobs that share an output directory or an incremental
+#   state file are run one after another so they do not overwrite each other's files
+
+class IrrService:
+
+    def __init__(self, workers=2, concurrentJobs=2, cache=None, maximumExports=64):
+
+        self.workers = workers
+        self.concurrentJobs = concurrentJobs
+        self.cache = cache
+        self.maximumExports = maximumExports
+        self.exports = OrderedDict()
+        self.parsing = {}
+        self.codeSets = {}
+        self.queue = asyncio.Queue()
+        self.runners = []
+        self.jobCount = 0
+        self.pathLocks = {}
+
+    async def start(self):
+
+        self.parsePool = ProcessPoolExecutor(max_workers=self.workers)
+        self.jobPool = ThreadPoolExecutor(max_workers=self.concurrentJobs)
+        self.runners = [asyncio.ensure_future(self.runJobs()) for runner in range(self.concurrentJobs)]
+
+    #   close waits for every queued job to finish before stopping the runners and the pools
+
+    async def close(self):
+
+        await self.queue.join()
+
+        for runner in self.runners:
+            runner.cancel()
+
+        await asyncio.gather(*self.runners, return_exceptions=True)
+
+        self.parsePool.shutdown()
+        self.jobPool.shutdown()
+
+    #   submit queues a job, a dictionary as described in main, and gives a future of the dictionary reported when it finishes
+
+    def submit(self, job):
+
+        self.jobCount += 1
+
+        if 'outputDir' not in job:
+            job = dict(job, outputDir=jobDirectoryName(job.get('id'), self.jobCount))
+
+        result = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((job, result))
+
+        return result
+
+    async def runJobs(self):
+
+        while True:
+
+            job, result = await self.queue.get()
+
+            try:
+                result.set_result(await self.runServiceJob(job))
+            finally:
+                self.queue.task_done()
+
+    #   loadExport gives the ReviewExport of jsonFileName, parsing it in the pool unless the export kept for it is of the same file
+
+    async def loadExport(self, jsonFileName):
+
+        fileStat = os.stat(jsonFileName)
+        fileKey = (jsonFileName, fileStat.st_size, fileStat.st_mtime_ns)
+
+        if jsonFileName in self.exports and self.exports[jsonFileName][0] == fileKey:
+            self.exports.move_to_end(jsonFileName)
+            return self.exports[jsonFileName][1]
+
+        if fileKey not in self.parsing:
+            self.parsing[fileKey] = asyncio.ensure_future(self.parseExport(jsonFileName, fileKey))
+
+        return await self.parsing[fileKey]
+
+    async def parseExport(self, jsonFileName, fileKey):
+
+        try:
+            reviewExport = await asyncio.get_running_loop().run_in_executor(self.parsePool, loadExport, jsonFileName, self.cache)
+        finally:
+            del self.parsing[fileKey]
+
+        setId = reviewExport.codeSets[0]['SetId']
+
+        if self.codeSets.get(setId) == reviewExport.codeSets:
+            reviewExport.codeSets = self.codeSets[setId]
+        else:
+            self.codeSets[setId] = reviewExport.codeSets
+
+        self.exports[jsonFileName] = (fileKey, reviewExport)
+        self.exports.move_to_end(jsonFileName)
+
+        while len(self.exports) > self.maximumExports:
+            self.exports.popitem(last=False)
+
+        return reviewExport
+
+    #   runServiceJob runs one job and gives the dictionary reported for it, with status 'error' and the error when the job fails
+
+    async def runServiceJob(self, job):
+
+        startTime = time.perf_counter()
+
+        try:
+
+            coderGroups = job['groups']
+            outputDirectory = job['outputDir']
+            jsonFileNames = list(dict.fromkeys(coderFile for coderFiles in coderGroups for coderFile in coderFiles))
+
+            reviewExports = dict(zip(jsonFileNames, await asyncio.gather(*[self.loadExport(jsonFileName) for jsonFileName in jsonFileNames])))
+
+            if job.get('levels') is not None:
+                attributeLevels = readAttributeLevels(job['levels'])
+            else:
+                attributeLevels = None
+
+            os.makedirs(outputDirectory, exist_ok=True)
+
+            jobFunction = functools.partial(runJob, coderGroups, outputDirectory, job.get('resultsFileName', resultsFileName),
+                                            job.get('spreadsheets', True), job.get('pairwiseAlpha', False),
+                                            incremental=job.get('incremental'), bootstrap=job.get('bootstrap', 0),
+                                            confidence=job.get('confidence', 0.95), seed=job.get('seed'),
+                                            computeTextAgreement=job.get('textAgreement', False), computeHierarchy=job.get('hierarchy', False),
+                                            columnarFormat=job.get('columnar'), attributeLevels=attributeLevels, reviewExports=reviewExports)
+
+            sharedPaths = {os.path.realpath(outputDirectory)}
+
+            if job.get('incremental') is not None:
+                sharedPaths.add(os.path.realpath(job['incremental']))
+
+            async with AsyncExitStack() as pathLocks:
+
+                for sharedPath in sorted(sharedPaths):
+                    await pathLocks.enter_async_context(self.pathLocks.setdefault(sharedPath, asyncio.Lock()))
+
+                jobResult = await asyncio.get_running_loop().run_in_executor(self.jobPool, jobFunction)
+
+        except Exception as error:
+
+            return {'id': job.get('id'), 'status': 'error', 'error': type(error).__name__ + ': ' + str(error),
+                    'seconds': time.perf_counter() - startTime}
+
+        return {'id': job.get('id'), 'status': 'done', 'outputDir': outputDirectory, 'seconds': time.perf_counter() - startTime,
+                'codenamesSame': [comparison.review1Codenames == comparison.review2Codenames for comparison in jobResult.comparisons],
+                'alphaValues': {key: jsonNumber(value) for key, value in jobResult.alphaValues.items()}}
+
+#   the jobDirectoryName function gives the output directory of a job that does not name one: 'job-' and its id, with any character
+#   that is not safe in a file name replaced, or its number in the order jobs were submitted when it has no id
+
+def jobDirectoryName(jobId, jobNumber):
+
+    if jobId is None:
+        return 'job-' + str(jobNumber)
+
+    return 'job-' + re.sub(r'[^\w.-]', '_', str(jobId))
+
+#   the jsonNumber function gives an alpha value as a float, or None when it is not a number, which JSON has no value for
+
+def jsonNumber(value):
+
+    value = float(value)
+
+    return None if math.isnan(value) else value
+
+#   the fileLines function reads the lines of a regular file in a thread, for stdin redirected from a file, which the event loop cannot
+#   read as a pipe
+
+async def fileLines(file):
+
+    while True:
+
+        line = await asyncio.get_running_loop().run_in_executor(None, file.readline)
+
+        if not line:
+            return
+
+        yield line
+
+#   the serveStream function submits a job for every JSON line read from reader, an asynchronous iterator of lines, and calls writeLine
+#   with a line for each job when it is queued and when it finishes, in the order the jobs finish. It returns once reader ends and every
+#   job it submitted has finished
+
+async def serveStream(service, reader, writeLine):
+
+    pending = []
+
+    async def reportWhenDone(result):
+
+        await writeLine(json.dumps(await result))
+
+    async for line in reader:
+
+        if not line.strip():
+            continue
+
+        try:
+            job = json.loads(line)
+            if not isinstance(job, dict) or 'groups' not in job:
+                raise ValueError('a job must be a JSON object with a groups list')
+        except ValueError as error:
+            await writeLine(json.dumps({'id': None, 'status': 'error', 'error': type(error).__name__ + ': ' + str(error)}))
+            continue
+
+        pending.append(asyncio.ensure_future(reportWhenDone(service.submit(job))))
+        await writeLine(json.dumps({'id': job.get('id'), 'status': 'queued', 'queued': service.queue.qsize()}))
+
+    await asyncio.gather(*pending)
+
+async def serve(arguments):
+
+    if arguments.cache_dir is not None:
+        cache = ExportCache(arguments.cache_dir, arguments.cache_size * 1024 * 1024)
+    else:
+        cache = None
+
+    service = IrrService(arguments.workers, arguments.jobs, cache, arguments.max_exports)
+    await service.start()
+
+    try:
+
+        if arguments.port is None:
+
+            stdinMode = os.fstat(sys.stdin.fileno()).st_mode
+
+            if stat.S_ISFIFO(stdinMode) or stat.S_ISSOCK(stdinMode) or stat.S_ISCHR(stdinMode):
+                reader = asyncio.StreamReader()
+                await asyncio.get_running_loop().connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+            else:
+                reader = fileLines(sys.stdin)
+
+            async def writeLine(line):
+                sys.stdout.write(line + '\n')
+                sys.stdout.flush()
+
+            await serveStream(service, reader, writeLine)
+
+        else:
+
+            async def handleConnection(reader, writer):
+
+                async def writeLine(line):
+                    writer.write(line.encode('utf8') + b'\n')
+                    await writer.drain()
+
+                try:
+                    await serveStream(service, reader, writeLine)
+                finally:
+                    writer.close()
+
+            server = await asyncio.start_server(handleConnection, arguments.host, arguments.port)
+
+            async with server:
+                await server.serve_forever()
+
+    finally:
+        await service.close()
+
+# the main function parses the command line and serves jobs until stdin ends, or until it is stopped when serving on a port. Each job is a
+# JSON object on one line: groups, a list of groups of JSON files with one file per coder, is required, and id, outputDir, resultsFileName,
+# spreadsheets, pairwiseAlpha, columnar, bootstrap, confidence, seed, textAgreement, hierarchy, levels and incremental are optional and
+# mean the same as on the command line of the script. Without outputDir the files of a job are written to job-<id>. File names are
+# relative to the directory the service was started in
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Run inter-rater reliability jobs given as JSON lines, keeping parsed exports between jobs')
+    parser.add_argument('--port', type=int, help='serve jobs on this TCP port instead of reading them from stdin')
+    parser.add_argument('--host', default='127.0.0.1', help='address to serve on with --port (default 127.0.0.1)')
+    parser.add_argument('--workers', type=int, default=2, help='number of processes used to parse JSON files (default 2)')
+    parser.add_argument('--jobs', type=int, default=2, help='number of jobs run at the same time (default 2)')
+    parser.add_argument('--max-exports', type=int, default=64, help='number of parsed exports kept between jobs (default 64)')
+    parser.add_argument('--cache-dir', help='directory of a cache of parsed exports, keyed by file content, kept between runs of the service')
+    parser.add_argument('--cache-size', type=int, default=1024, help='maximum size of the cache in megabytes (default 1024)')
+    arguments = parser.parse_args(argv)
+
+    try:
+        asyncio.run(serve(arguments))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
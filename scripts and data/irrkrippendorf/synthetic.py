@@ -0,0 +1,130 @@
+########################################################################################################################
+#   Synthetic EPPI reviewer exports, with the same structure as the real JSON files, for benchmarking the calculation on
+#   any number of papers, codeset sizes, arms, annotation densities and coders
+########################################################################################################################
+
+
+import json
+import os
+import random
+from itertools import count
+
+syntheticWords = ['smoking', 'cessation', 'school', 'hospital', 'clinic', 'adolescents', 'urban', 'rural', 'intervention',
+                  'participants', 'randomised', 'trial', 'community', 'pharmacy', 'region', 'county', 'city', 'students',
+                  'outpatient', 'facility', 'residential', 'primary', 'care', 'centre', 'district', 'national', 'health']
+
+#   the syntheticCodeSet function gives a codeset in the layout of the CodeSets of an export, where every attribute down to the given
+#   depth has width children. AttributeIds are numbered from firstAttributeId in preorder
+
+def syntheticCodeSet(setId, depth, width, firstAttributeId=1000000):
+
+    attributeIds = count(firstAttributeId)
+
+    def attributesList(level, namePrefix):
+
+        attributes = []
+
+        for child in range(width):
+
+            attributeName = namePrefix + str(child + 1)
+
+            attribute = {'AttributeSetId': 0, 'AttributeId': next(attributeIds), 'AttributeSetDescription': '',
+                         'AttributeType': 'Selectable (show checkbox)', 'AttributeName': 'Attribute ' + attributeName, 'AttributeDescription': ''}
+
+            if level < depth:
+                attribute['Attributes'] = {'AttributesList': attributesList(level + 1, attributeName + '.')}
+
+            attributes.append(attribute)
+
+        return attributes
+
+    return {'SetName': 'Synthetic codeset ' + str(setId), 'ReviewSetId': setId, 'SetId': setId,
+            'SetType': {'SetTypeName': 'Standard', 'SetTypeDescription': ''}, 'SetDescription': '',
+            'Attributes': {'AttributesList': attributesList(1, '')}}
+
+#   the syntheticText function gives the Text of one annotation, a quote of roughly textLength characters marked up as EPPI reviewer
+#   exports PDF annotations
+
+def syntheticText(randomGenerator, textLength):
+
+    words = []
+
+    while sum(len(word) + 1 for word in words) < textLength:
+        words.append(randomGenerator.choice(syntheticWords))
+
+    return 'Page ' + str(randomGenerator.randint(1, 20)) + ':\n[¬s]"' + ' '.join(words) + '[¬e]"'
+
+#   the writeSyntheticExports function writes one JSON file per coder to directory and returns their file names. Each paper has arms arms
+#   (0 for whole-study coding only), and every attribute of every arm is coded with probability density. Each coder codes a coded cell
+#   with probability agreement, and an uncoded one with probability (1 - agreement) x density so that disagreements do not swamp a
+#   sparse codeset. A coder annotates the same text as the others with probability agreement. A tenth of the cells are ticked with no
+#   text
+
+def writeSyntheticExports(directory, papers=100, depth=3, width=4, arms=0, density=0.1, coders=2, textLength=40, agreement=0.8, seed=0,
+                          setId=1, filePrefix='Synthetic'):
+
+    randomGenerator = random.Random(seed)
+    codeSet = syntheticCodeSet(setId, depth, width)
+
+    def attributeIds(attributes):
+
+        for attribute in attributes:
+
+            yield attribute['AttributeId']
+
+            if 'Attributes' in attribute:
+                yield from attributeIds(attribute['Attributes']['AttributesList'])
+
+    allAttributeIds = list(attributeIds(codeSet['Attributes']['AttributesList']))
+    armTitles = ['Arm ' + str(arm + 1) for arm in range(arms)] or ['']
+
+    coderReferences = [[] for coder in range(coders)]
+
+    for paper in range(papers):
+
+        itemId = 10000000 + paper
+        coderCodes = [[] for coder in range(coders)]
+
+        for attributeId in allAttributeIds:
+
+            for armNumber, armTitle in enumerate(armTitles):
+
+                coded = randomGenerator.random() < density
+                tickedNoValue = randomGenerator.random() < 0.1
+                sharedText = None
+
+                for coder in range(coders):
+
+                    if randomGenerator.random() >= (agreement if coded else (1 - agreement) * density):
+                        continue
+
+                    code = {'AttributeId': attributeId, 'AdditionalText': '', 'ArmId': armNumber, 'ArmTitle': armTitle}
+
+                    if not tickedNoValue:
+
+                        if sharedText is None:
+                            sharedText = syntheticText(randomGenerator, textLength)
+
+                        text = sharedText if randomGenerator.random() < agreement else syntheticText(randomGenerator, textLength)
+
+                        code['ItemAttributeFullTextDetails'] = [{'ItemDocumentId': itemId, 'TextFrom': 0, 'TextTo': 0, 'Text': text,
+                                                                 'IsFromPDF': True, 'DocTitle': 'Paper' + str(paper + 1) + '.pdf', 'ItemArm': armTitle}]
+
+                    coderCodes[coder].append(code)
+
+        for coder in range(coders):
+            coderReferences[coder].append({'ItemId': itemId, 'Title': 'Synthetic paper ' + str(paper + 1), 'ShortTitle': 'Author' + str(paper + 1),
+                                           'Codes': coderCodes[coder]})
+
+    jsonFileNames = []
+
+    for coder in range(coders):
+
+        jsonFileName = os.path.join(directory, filePrefix + '_Coder' + str(coder + 1) + '.json')
+
+        with open(jsonFileName, 'w', encoding='utf8') as f:
+            json.dump({'CodeSets': [codeSet], 'References': coderReferences[coder]}, f)
+
+        jsonFileNames.append(jsonFileName)
+
+    return jsonFileNames
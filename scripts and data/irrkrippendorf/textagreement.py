@@ -0,0 +1,336 @@
+########################################################################################################################
+#   Agreement of the text the coders annotated, alongside the reliability of the binary values
+########################################################################################################################
+
+
+import re
+import numpy as np
+from array import array
+from itertools import combinations
+
+#   the TextAgreement class measures how closely the coders' annotated text agrees, working on the text cells that sortCodes gives. For
+#   every row and every pair of coders who both annotated text it records the pair of cells, and values gives for each attribute the
+#   mean over those pairs of three measures: exact match of the normalised spans, the Jaccard index of the two sets of word tokens, and
+#   the character overlap of the spans. Every distinct cell is split into spans and tokenised only once, and its spans, tokens and
+#   character offsets are kept in flat arrays, so the measures of all distinct pairs of cells are worked out at once with NumPy
+
+class TextAgreement:
+
+    #   a cell with more than one span is the spans joined by ';' and ends with ';'. Each span keeps what is left of the 'Page N:' prefix
+    #   after sortCodes and is wrapped in quotes, both of which are removed
+
+    spanPrefix = re.compile(r'^\s*\d*:?\]?')
+    tokenPattern = re.compile(r'\w+')
+
+    untextedCells = ('nothing coded', 'code ticked with no value')
+
+    #   hashBase is the base of the polynomial hashes, modulo 2 ** 64, used to find where the end of one span starts another
+
+    hashBase = 1000003
+    hashChunkSize = 1 << 22
+
+    def __init__(self, numberOfCoders):
+
+        self.coderPairs = list(combinations(range(numberOfCoders), 2))
+        self.attributeIndexByTitle = {}
+        self.cellNumbers = {}
+        self.spanNumbers = {}
+        self.spanTexts = []
+        self.spanSetNumbers = {}
+        self.cellSpanSet = array('q')
+        self.cellLengths = array('q')
+        self.spanOffsets = array('q', [0])
+        self.spanValues = array('q')
+        self.cellUsesOffsets = array('b')
+        self.cellIntervalLengths = array('q')
+        self.intervalOffsets = array('q', [0])
+        self.intervalDocuments = array('q')
+        self.intervalStarts = array('q')
+        self.intervalEnds = array('q')
+        self.tokenNumbers = {}
+        self.tokenOffsets = array('q', [0])
+        self.tokenValues = array('q')
+        self.pairAttribute = array('l')
+        self.pairFirstCell = array('l')
+        self.pairSecondCell = array('l')
+
+    #   cellNumber gives the number of a distinct cell, a cell text with the offsets of its texts. The offsets of a cell are used for its
+    #   character overlap when every text has a TextTo past its TextFrom, which EPPI reviewer exports for annotations of documents other
+    #   than PDFs; otherwise the overlap is worked out from the text
+
+    def cellNumber(self, cellText, offsets):
+
+        cellNumber = self.cellNumbers.get((cellText, offsets))
+
+        if cellNumber is None:
+
+            cellNumber = len(self.cellLengths)
+            self.cellNumbers[(cellText, offsets)] = cellNumber
+
+            spanTexts = cellText.split(';')[:-1] if cellText.endswith(';') else [cellText]
+            spans = tuple(' '.join(self.spanPrefix.sub('', spanText).strip().strip('"').casefold().split()) for spanText in spanTexts)
+            tokens = {self.tokenNumbers.setdefault(token, len(self.tokenNumbers)) for span in spans for token in self.tokenPattern.findall(span)}
+
+            self.cellSpanSet.append(self.spanSetNumbers.setdefault(tuple(sorted(spans)), len(self.spanSetNumbers)))
+            self.cellLengths.append(sum(len(span) for span in spans))
+            self.tokenValues.extend(sorted(tokens))
+            self.tokenOffsets.append(len(self.tokenValues))
+
+            for span in spans:
+                if span not in self.spanNumbers:
+                    self.spanNumbers[span] = len(self.spanTexts)
+                    self.spanTexts.append(span)
+                self.spanValues.append(self.spanNumbers[span])
+
+            self.spanOffsets.append(len(self.spanValues))
+
+            usesOffsets = offsets is not None and len(offsets) > 0 and all(textTo > textFrom for document, textFrom, textTo in offsets)
+
+            self.cellUsesOffsets.append(usesOffsets)
+            self.cellIntervalLengths.append(sum(textTo - textFrom for document, textFrom, textTo in offsets) if usesOffsets else 0)
+
+            if usesOffsets:
+                for document, textFrom, textTo in offsets:
+                    self.intervalDocuments.append(document)
+                    self.intervalStarts.append(textFrom)
+                    self.intervalEnds.append(textTo)
+
+            self.intervalOffsets.append(len(self.intervalStarts))
+
+        return cellNumber
+
+    def addRow(self, textRow):
+
+        attributeIndex = self.attributeIndexByTitle.setdefault(textRow[3], len(self.attributeIndexByTitle))
+        coderTexts = textRow[5:]
+        coderOffsets = getattr(textRow, 'spanOffsets', None) or (None,) * len(coderTexts)
+
+        for coder1, coder2 in self.coderPairs:
+
+            if coderTexts[coder1] not in self.untextedCells and coderTexts[coder2] not in self.untextedCells:
+
+                self.pairAttribute.append(attributeIndex)
+                self.pairFirstCell.append(self.cellNumber(coderTexts[coder1], coderOffsets[coder1]))
+                self.pairSecondCell.append(self.cellNumber(coderTexts[coder2], coderOffsets[coder2]))
+
+    #   entryPairs gives every pair of entries of two cells for many pairs of cells, where the entries of cell i are entryOffsets[i] to
+    #   entryOffsets[i + 1] - 1: the number of the pair of cells and the first and second entry of each
+
+    @staticmethod
+    def entryPairs(entryOffsets, firstCells, secondCells):
+
+        firstStarts = entryOffsets[firstCells]
+        firstCounts = entryOffsets[firstCells + 1] - firstStarts
+        secondStarts = entryOffsets[secondCells]
+        secondCounts = entryOffsets[secondCells + 1] - secondStarts
+
+        products = firstCounts * secondCounts
+        pairNumber = np.repeat(np.arange(len(firstCells)), products)
+        within = np.arange(products.sum()) - np.repeat(np.cumsum(products) - products, products)
+
+        return [pairNumber, firstStarts[pairNumber] + within // secondCounts[pairNumber], secondStarts[pairNumber] + within % secondCounts[pairNumber]]
+
+    #   bestOverlapTotals gives, for each pair of cells, the sum over the entries on one side of the largest overlap each has with an
+    #   entry of the other side
+
+    @staticmethod
+    def bestOverlapTotals(pairNumber, entries, overlaps, numberOfEntries, numberOfPairs):
+
+        keys, keyNumber = np.unique(pairNumber * numberOfEntries + entries, return_inverse=True)
+
+        bestOverlaps = np.zeros(len(keys))
+        np.maximum.at(bestOverlaps, keyNumber.reshape(-1), overlaps)
+
+        return np.bincount(keys // numberOfEntries, weights=bestOverlaps, minlength=numberOfPairs)
+
+    #   spanHashes gives the characters of every distinct span as one array with the span's start in it, and the prefix sums of the
+    #   characters weighted by hashBase to the power of their position in the span, from which the hash of any piece of a span is the
+    #   difference of two sums times an inverse power. The arithmetic wraps modulo 2 ** 64
+
+    def spanHashes(self):
+
+        spanLengths = np.array([len(span) for span in self.spanTexts], dtype=np.int64)
+        spanStarts = np.concatenate([[0], np.cumsum(spanLengths)])
+        characters = np.frombuffer(''.join(self.spanTexts).encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+
+        maximumLength = int(spanLengths.max(initial=0)) + 1
+        powers = np.cumprod(np.concatenate([np.ones(1, dtype=np.uint64), np.full(maximumLength - 1, self.hashBase, dtype=np.uint64)]))
+        inversePowers = np.cumprod(np.concatenate([np.ones(1, dtype=np.uint64), np.full(maximumLength - 1, pow(self.hashBase, -1, 1 << 64), dtype=np.uint64)]))
+
+        positions = np.arange(len(characters)) - np.repeat(spanStarts[:-1], spanLengths)
+        prefixSums = np.concatenate([np.zeros(1, dtype=np.uint64), np.cumsum(characters * powers[positions], dtype=np.uint64)])
+
+        return [spanLengths, spanStarts, prefixSums, inversePowers]
+
+    #   endOverlaps gives, for pairs of distinct spans, the length of the longest end of the first span that starts the second. The
+    #   hashes of every end of the first are compared with those of every start of the second at once, a chunk of pairs at a time, and
+    #   the longest match is checked against the text, falling back to a scan when hashes collided
+
+    def endOverlaps(self, firstSpans, secondSpans, spanHashes):
+
+        spanLengths, spanStarts, prefixSums, inversePowers = spanHashes
+
+        candidates = np.minimum(spanLengths[firstSpans], spanLengths[secondSpans])
+        overlaps = np.zeros(len(firstSpans), dtype=np.int64)
+
+        candidateEnds = np.cumsum(candidates)
+        chunkBoundaries = np.unique(np.searchsorted(candidateEnds, np.arange(self.hashChunkSize, candidateEnds[-1] if len(candidateEnds) else 0, self.hashChunkSize)) + 1)
+        chunkBoundaries = [0] + chunkBoundaries[chunkBoundaries < len(firstSpans)].tolist() + [len(firstSpans)]
+
+        for chunkStart, chunkEnd in zip(chunkBoundaries[:-1], chunkBoundaries[1:]):
+
+            chunkCandidates = candidates[chunkStart:chunkEnd]
+            rows = np.repeat(np.arange(chunkStart, chunkEnd), chunkCandidates)
+            lengths = np.arange(len(rows)) - np.repeat(np.cumsum(chunkCandidates) - chunkCandidates, chunkCandidates) + 1
+
+            firstEnds = spanStarts[firstSpans[rows] + 1]
+            firstHashes = (prefixSums[firstEnds] - prefixSums[firstEnds - lengths]) * inversePowers[spanLengths[firstSpans[rows]] - lengths]
+
+            secondStarts = spanStarts[secondSpans[rows]]
+            secondHashes = prefixSums[secondStarts + lengths] - prefixSums[secondStarts]
+
+            matches = firstHashes == secondHashes
+            np.maximum.at(overlaps, rows[matches], lengths[matches])
+
+        for row in np.flatnonzero(overlaps).tolist():
+
+            first, second = self.spanTexts[firstSpans[row]], self.spanTexts[secondSpans[row]]
+
+            if first[len(first) - overlaps[row]:] != second[:overlaps[row]]:
+                overlaps[row] = max([length for length in range(1, int(candidates[row]) + 1) if first[len(first) - length:] == second[:length]], default=0)
+
+        return overlaps
+
+    #   spanOverlaps gives the number of characters two spans quoted from the same document have in common, for many pairs of spans: the
+    #   whole of the shorter one when one contains the other, otherwise the longest end of either that starts the other. Each distinct pair
+    #   of spans is only compared once
+
+    def spanOverlaps(self, firstSpans, secondSpans):
+
+        numberOfSpans = max(len(self.spanTexts), 1)
+
+        spanPairs, spanPairNumber = np.unique(np.minimum(firstSpans, secondSpans) * numberOfSpans + np.maximum(firstSpans, secondSpans), return_inverse=True)
+        span1, span2 = spanPairs // numberOfSpans, spanPairs % numberOfSpans
+
+        spanHashes = self.spanHashes()
+        spanLengths = spanHashes[0]
+
+        contained = np.array([self.spanTexts[first] in self.spanTexts[second] or self.spanTexts[second] in self.spanTexts[first]
+                              for first, second in zip(span1.tolist(), span2.tolist())], dtype=bool)
+
+        overlaps = np.minimum(spanLengths[span1], spanLengths[span2])
+        notContained = np.flatnonzero(~contained)
+
+        overlaps[notContained] = np.maximum(self.endOverlaps(span1[notContained], span2[notContained], spanHashes),
+                                            self.endOverlaps(span2[notContained], span1[notContained], spanHashes))
+
+        return overlaps[spanPairNumber.reshape(-1)]
+
+    #   characterOverlap gives, for many pairs of cells, the share of both cells' characters that fall in a span overlapping a span of the
+    #   other cell, matching each span with the span of the other cell it overlaps most. When both cells have offsets the spans overlap
+    #   where their offsets in the same document do; otherwise the overlap of the spans is worked out from their text
+
+    def characterOverlap(self, firstCells, secondCells):
+
+        cellUsesOffsets = np.array(self.cellUsesOffsets, dtype=bool)
+        byOffsets = cellUsesOffsets[firstCells] & cellUsesOffsets[secondCells]
+
+        overlapTotals = np.zeros(len(firstCells))
+        characterTotals = np.zeros(len(firstCells))
+
+        #   the pairs of cells that are both measured by their offsets
+
+        intervalOffsets = np.array(self.intervalOffsets, dtype=np.int64)
+        documents, starts, ends = (np.array(values, dtype=np.int64) for values in (self.intervalDocuments, self.intervalStarts, self.intervalEnds))
+
+        pairs = np.flatnonzero(byOffsets)
+        pairNumber, firstEntries, secondEntries = self.entryPairs(intervalOffsets, firstCells[pairs], secondCells[pairs])
+
+        overlaps = np.where(documents[firstEntries] == documents[secondEntries],
+                            np.maximum(np.minimum(ends[firstEntries], ends[secondEntries]) - np.maximum(starts[firstEntries], starts[secondEntries]), 0), 0)
+
+        overlapTotals[pairs] = self.bestOverlapTotals(pairNumber, firstEntries, overlaps, len(starts), len(pairs)) \
+            + self.bestOverlapTotals(pairNumber, secondEntries, overlaps, len(starts), len(pairs))
+
+        cellIntervalLengths = np.array(self.cellIntervalLengths, dtype=np.int64)
+        characterTotals[pairs] = cellIntervalLengths[firstCells[pairs]] + cellIntervalLengths[secondCells[pairs]]
+
+        #   the pairs of cells measured by their text
+
+        spanOffsets = np.array(self.spanOffsets, dtype=np.int64)
+        spanValues = np.array(self.spanValues, dtype=np.int64)
+
+        pairs = np.flatnonzero(~byOffsets)
+        pairNumber, firstEntries, secondEntries = self.entryPairs(spanOffsets, firstCells[pairs], secondCells[pairs])
+
+        overlaps = self.spanOverlaps(spanValues[firstEntries], spanValues[secondEntries]) if len(pairNumber) else np.zeros(0)
+
+        overlapTotals[pairs] = self.bestOverlapTotals(pairNumber, firstEntries, overlaps, len(spanValues), len(pairs)) \
+            + self.bestOverlapTotals(pairNumber, secondEntries, overlaps, len(spanValues), len(pairs))
+
+        cellLengths = np.array(self.cellLengths, dtype=np.int64)
+        characterTotals[pairs] = cellLengths[firstCells[pairs]] + cellLengths[secondCells[pairs]]
+
+        return np.divide(overlapTotals, characterTotals, out=np.ones(len(firstCells)), where=characterTotals > 0)
+
+    #   tokenJaccard gives the Jaccard index of the token sets of many pairs of cells. The sorted token numbers of each pair are keyed by
+    #   the pair's position and put together, so the tokens the two cells share are the keys that appear twice
+
+    def tokenJaccard(self, firstCells, secondCells):
+
+        tokenOffsets = np.array(self.tokenOffsets, dtype=np.int64)
+        tokenValues = np.array(self.tokenValues, dtype=np.int64)
+
+        def gatherTokens(cells):
+
+            starts = tokenOffsets[cells]
+            lengths = tokenOffsets[cells + 1] - starts
+            positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+
+            return [tokenValues[positions], np.repeat(np.arange(len(cells)), lengths), lengths]
+
+        firstTokens, firstPairs, firstLengths = gatherTokens(firstCells)
+        secondTokens, secondPairs, secondLengths = gatherTokens(secondCells)
+
+        keys = np.sort(np.concatenate([firstPairs * (len(self.tokenNumbers) + 1) + firstTokens, secondPairs * (len(self.tokenNumbers) + 1) + secondTokens]))
+        shared = np.bincount(keys[1:][keys[1:] == keys[:-1]] // (len(self.tokenNumbers) + 1), minlength=len(firstCells))
+
+        union = firstLengths + secondLengths - shared
+
+        return np.divide(shared, union, out=np.ones(len(firstCells)), where=union > 0)
+
+    #   values gives, for every attribute with at least one pair of texted cells, and for 'All Entities' and 'Entities with data' over
+    #   every pair, a list of the number of pairs and the mean exact match, token Jaccard index and character overlap
+
+    def values(self):
+
+        pairAttribute = np.array(self.pairAttribute, dtype=np.intp)
+        pairCells = np.stack([np.array(self.pairFirstCell, dtype=np.int64), np.array(self.pairSecondCell, dtype=np.int64)], axis=1).reshape(-1, 2)
+
+        #   the measures are worked out once for every distinct pair of cells and then spread back to the rows
+
+        distinctPairs, pairNumber = np.unique(pairCells, axis=0, return_inverse=True)
+        pairNumber = pairNumber.reshape(-1)
+
+        cellSpanSet = np.array(self.cellSpanSet, dtype=np.int64)
+
+        exactMatch = (cellSpanSet[distinctPairs[:, 0]] == cellSpanSet[distinctPairs[:, 1]]).astype(np.float64)
+        jaccard = self.tokenJaccard(distinctPairs[:, 0], distinctPairs[:, 1])
+        characterOverlap = self.characterOverlap(distinctPairs[:, 0], distinctPairs[:, 1])
+
+        measures = np.stack([exactMatch, jaccard, characterOverlap]).reshape(3, -1)[:, pairNumber]
+
+        numberOfTitles = len(self.attributeIndexByTitle)
+        pairCounts = np.bincount(pairAttribute, minlength=numberOfTitles)
+        measureTotals = np.array([np.bincount(pairAttribute, weights=measure, minlength=numberOfTitles) for measure in measures]).reshape(3, numberOfTitles)
+
+        textValues = {title: [int(pairCounts[i])] + (measureTotals[:, i] / pairCounts[i]).tolist()
+                      for title, i in self.attributeIndexByTitle.items() if pairCounts[i] > 0}
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            overallValues = [int(pairCounts.sum())] + (measureTotals.sum(axis=1) / pairCounts.sum()).tolist()
+
+        textValues['All Entities'] = overallValues
+        textValues['Entities with data'] = overallValues
+
+        return textValues
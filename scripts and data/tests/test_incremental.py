@@ -0,0 +1,97 @@
+########################################################################################################################
+#   An incremental run must give the same output files as a full run on the same exports, after the exports change
+########################################################################################################################
+
+
+import json
+import os
+import shutil
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from irrkrippendorf.api import resultsFileName, runJob
+from irrkrippendorf.merge import binarySpreadsheetFileName, textSpreadsheetFileName
+from irrkrippendorf.synthetic import writeSyntheticExports
+
+dataDirectory = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+#   the incrementalAndFullOutputs function runs coderGroups incrementally, calls changeExports, runs them incrementally again and then in
+#   full, and gives the contents of the output files of the second incremental run and of the full run
+
+def incrementalAndFullOutputs(directory, coderGroups, changeExports, **options):
+
+    for outputName in ['incremental', 'full']:
+        os.makedirs(os.path.join(directory, outputName))
+
+    stateFileName = os.path.join(directory, 'state.pkl')
+
+    runJob(coderGroups, os.path.join(directory, 'incremental'), incremental=stateFileName, **options)
+    changeExports()
+    runJob(coderGroups, os.path.join(directory, 'incremental'), incremental=stateFileName, **options)
+    runJob(coderGroups, os.path.join(directory, 'full'), **options)
+
+    outputs = []
+
+    for outputName in ['incremental', 'full']:
+
+        outputs.append({})
+
+        for fileName in [resultsFileName, binarySpreadsheetFileName, textSpreadsheetFileName]:
+            with open(os.path.join(directory, outputName, fileName), 'rb') as f:
+                outputs[-1][fileName] = f.read()
+
+    return outputs
+
+def editExport(jsonFileName, editReferences):
+
+    with open(jsonFileName, encoding='utf8') as f:
+        export = json.load(f)
+
+    editReferences(export['References'])
+
+    with open(jsonFileName, 'w', encoding='utf8') as f:
+        json.dump(export, f)
+
+def test_incremental_matches_full_run_with_four_coders(tmp_path):
+
+    jsonFileNames = writeSyntheticExports(str(tmp_path), papers=40, depth=2, width=3, arms=2, density=0.3, coders=4, agreement=0.7, seed=5)
+
+    def changeExports():
+
+        def editReferences(references):
+            references[3]['Codes'] = references[3]['Codes'][1:]
+            del references[10]
+
+        editExport(jsonFileNames[1], editReferences)
+
+    incrementalOutputs, fullOutputs = incrementalAndFullOutputs(str(tmp_path), [jsonFileNames], changeExports, computePairwiseAlpha=True)
+
+    assert incrementalOutputs == fullOutputs
+
+#   an attribute coded with an empty list of text details gives no row for its paper, so when that paper is the first one the
+#   attribute's title first appears in a later paper
+
+def test_incremental_keeps_attributes_missing_from_the_first_paper(tmp_path):
+
+    for fileName in ['Behaviour1_Coder1.json', 'Behaviour1_Coder2.json']:
+        shutil.copy(os.path.join(dataDirectory, fileName), str(tmp_path))
+
+    coderGroups = [[os.path.join(str(tmp_path), 'Behaviour1_Coder' + str(coder) + '.json') for coder in [1, 2]]]
+
+    def emptyTextDetails(references):
+
+        for code in references[0]['Codes']:
+            code['ItemAttributeFullTextDetails'] = []
+
+    def changeExports():
+
+        editExport(coderGroups[0][0], lambda references: references[2]['Codes'].pop())
+
+    for jsonFileName in coderGroups[0]:
+        editExport(jsonFileName, emptyTextDetails)
+
+    incrementalOutputs, fullOutputs = incrementalAndFullOutputs(str(tmp_path), coderGroups, changeExports)
+
+    assert b'"Country of intervention"' in fullOutputs[resultsFileName]
+    assert incrementalOutputs == fullOutputs
@@ -0,0 +1,97 @@
+########################################################################################################################
+#   The alpha values of typed attributes must be those of the krippendorff package at every level of measurement, and a
+#   levels file that gives no attribute a typed level must leave every alpha value nominal
+########################################################################################################################
+
+
+import csv
+import os
+import sys
+import warnings
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from irrkrippendorf.api import resultsFileName, runJob
+from irrkrippendorf.reliability import typedAlphaValues
+from irrkrippendorf.synthetic import writeSyntheticExports
+
+krippendorff = pytest.importorskip('krippendorff')
+
+#   the typedData function gives a coders x rows matrix of ratings from 1 to 5, with about a fifth of the values missing, for attributes
+#   with the given numbers of rows, and the attribute of each row. Every attribute uses every rating, so attributes of the same level
+#   are computed together in one batch
+
+def typedData(rowsByAttribute, numberOfCoders=3, seed=0):
+
+    generator = np.random.default_rng(seed)
+    attributeIndex = np.repeat(np.arange(len(rowsByAttribute)), rowsByAttribute)
+
+    truth = generator.integers(1, 6, len(attributeIndex))
+    data = np.where(generator.random((numberOfCoders, len(attributeIndex))) < 0.7, truth, generator.integers(1, 6, (numberOfCoders, len(attributeIndex))))
+    data = data.astype(np.float64)
+
+    data[generator.random(data.shape) < 0.2] = np.nan
+
+    for attribute in range(len(rowsByAttribute)):
+        data[0, np.flatnonzero(attributeIndex == attribute)[:5]] = [1, 2, 3, 4, 5]
+
+    return [attributeIndex, data]
+
+@pytest.mark.parametrize('level', ['nominal', 'ordinal', 'interval', 'ratio'])
+def test_typed_alpha_matches_krippendorff(level):
+
+    attributeIndex, data = typedData([40, 25, 60])
+
+    alphas = typedAlphaValues([level] * 3, attributeIndex, data)
+
+    for attribute in range(3):
+        expected = krippendorff.alpha(reliability_data=data[:, attributeIndex == attribute], level_of_measurement=level)
+        assert alphas[attribute] == pytest.approx(expected)
+
+def test_typed_alpha_with_mixed_levels_and_value_domains():
+
+    attributeIndex, data = typedData([30, 30, 30, 30], seed=1)
+    data[:, attributeIndex == 3] *= 10
+    levels = ['ordinal', 'interval', 'ordinal', 'ratio']
+
+    alphas = typedAlphaValues(levels, attributeIndex, data)
+
+    for attribute, level in enumerate(levels):
+        expected = krippendorff.alpha(reliability_data=data[:, attributeIndex == attribute], level_of_measurement=level)
+        assert alphas[attribute] == pytest.approx(expected)
+
+def test_typed_alpha_with_no_attributes():
+
+    alphas = typedAlphaValues([], np.zeros(0, dtype=np.intp), np.zeros((2, 0)))
+
+    assert alphas.shape == (0,)
+
+def test_levels_matching_no_attribute_leave_results_nominal(tmp_path):
+
+    jsonFileNames = writeSyntheticExports(str(tmp_path), papers=20, depth=2, width=3, density=0.3, coders=2, seed=3)
+
+    os.makedirs(os.path.join(str(tmp_path), 'nominal'))
+    runJob([jsonFileNames], os.path.join(str(tmp_path), 'nominal'), writeSpreadsheets=False)
+
+    with open(os.path.join(str(tmp_path), 'nominal', resultsFileName), newline='') as f:
+        nominalRows = list(csv.reader(f))
+
+    for levels, unused in [({'Not an attribute': 'ordinal'}, True), ({123456789: 'interval'}, True), ({nominalRows[1][0]: 'nominal'}, False)]:
+
+        outputDirectory = os.path.join(str(tmp_path), 'levels' + str(len(os.listdir(str(tmp_path)))))
+        os.makedirs(outputDirectory)
+
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            runJob([jsonFileNames], outputDirectory, writeSpreadsheets=False, attributeLevels=levels)
+
+        assert any('left unused' in str(warning.message) for warning in caught) == unused
+
+        with open(os.path.join(outputDirectory, resultsFileName), newline='') as f:
+            levelRows = list(csv.reader(f))
+
+        assert [row[:2] for row in levelRows] == [row[:2] for row in nominalRows]
+        assert [row[2] for row in levelRows[1:]] == ['nominal'] * (len(levelRows) - 1)